@@ -0,0 +1,102 @@
+import argparse
+import asyncio
+import time
+
+"""
+Http benchmark for comparing the server engines.
+
+Start the project server with one of the engines and run the benchmark against it:
+    python3 main.py startserver --threads=16
+    python3 main.py startserver --engine=asyncio
+    python3 benchmarks/http_bench.py http://127.0.0.1:8888/ --concurrency=64 --requests=5000 --idle=1000
+
+The benchmark prints connections per second (new connection for every request), requests per second over
+keep-alive connections and p50/p99 latency. With --idle, the idle connections are opened before the run
+and stay open during it.
+"""
+
+
+async def _request(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, host: str, path: str,
+                   keep_alive: bool) -> bool:
+    connection = 'keep-alive' if keep_alive else 'close'
+    writer.write(bytes(f'GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: {connection}\r\n\r\n', 'latin-1'))
+    await writer.drain()
+    status_line = await reader.readline()
+    length = None
+    server_keep_alive = status_line.startswith(b'HTTP/1.1')
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        match name.strip().lower():
+            case 'content-length':
+                length = int(value)
+            case 'connection':
+                server_keep_alive = value.strip().lower() == 'keep-alive'
+    if length is None:
+        await reader.read()
+        return False
+    await reader.readexactly(length)
+    return keep_alive and server_keep_alive
+
+
+async def _worker(host: str, port: int, path: str, requests: int, keep_alive: bool, latencies: list[float]):
+    reader = writer = None
+    for _ in range(requests):
+        started = time.perf_counter()
+        if writer is None:
+            reader, writer = await asyncio.open_connection(host, port)
+        if not await _request(reader, writer, host, path, keep_alive):
+            writer.close()
+            reader = writer = None
+        latencies.append(time.perf_counter() - started)
+    if writer:
+        writer.close()
+
+
+async def _run(host: str, port: int, path: str, concurrency: int, requests: int, keep_alive: bool) -> tuple:
+    latencies = []
+    per_worker = max(requests // concurrency, 1)
+    started = time.perf_counter()
+    await asyncio.gather(*[_worker(host, port, path, per_worker, keep_alive, latencies) for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return (len(latencies) / elapsed, latencies[len(latencies) // 2] * 1000,
+            latencies[min(int(len(latencies) * 0.99), len(latencies) - 1)] * 1000)
+
+
+async def _open_idle(host: str, port: int, count: int) -> list:
+    connections = []
+    for _ in range(count):
+        try:
+            connections.append(await asyncio.open_connection(host, port))
+        except OSError:
+            break
+    return connections
+
+
+async def main(url: str, concurrency: int, requests: int, idle: int):
+    hostport, _, path = url.split('://')[-1].partition('/')
+    host, _, port = hostport.partition(':')
+    path = '/' + path
+    port = int(port or 80)
+
+    idle_connections = await _open_idle(host, port, idle)
+    print(f'Idle connections open: {len(idle_connections)}')
+    print(f'{"mode":<12}{"per sec":>12}{"p50 ms":>10}{"p99 ms":>10}')
+    for mode, keep_alive in (('connections', False), ('keep-alive', True)):
+        rate, p50, p99 = await _run(host, port, path, concurrency, requests, keep_alive)
+        print(f'{mode:<12}{rate:>12.1f}{p50:>10.2f}{p99:>10.2f}')
+    for reader, writer in idle_connections:
+        writer.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Http server benchmark.')
+    parser.add_argument('url')
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--idle', type=int, default=0)
+    args = parser.parse_args()
+    asyncio.run(main(args.url, args.concurrency, args.requests, args.idle))
@@ -3,7 +3,12 @@ import sys
 import fire
 import os
 from http.server import HTTPServer
-from flow.http.server import Server
+from flow.http.server import Server, ThreadPoolHTTPServer
+from flow.http.workers import PreforkServer
+from flow.http.aserver import AsyncServer
+from flow.http.dispatch import get_middlewares
+from flow.exceptions.http_exceptions import WorkerCrashError
+from flow.utils.timings import get_timings
 from fconfig.fsettings import SERVER_PORT, SERVER_HOST, APPS
 import importlib
 from flow.database.model.models import Model, Migrate, ApplyMigrations
@@ -23,23 +28,51 @@ class Command:
                     with open(file.filepath, 'r') as sf:
                         f.write(sf.read())
 
-    def startserver(self, reloader=False):
+    def startserver(self, reloader=False, threads=0, workers=0, reuse_port=False, engine='http'):
+        """
+        :param reloader: Restart the server after any project file is changed.
+        :param threads: Number of worker threads. With 0, requests are handled one at a time.
+        :param workers: Number of pre-forked worker processes. SIGTERM stops and SIGHUP restarts
+                        the workers after in-flight requests are finished.
+        :param reuse_port: Workers bind their own sockets with SO_REUSEPORT instead of sharing one socket.
+        :param engine: 'http' - http.server based server, 'asyncio' - asyncio based server in one process,
+                       threads set the number of executor threads for synchronous views.
+        """
+        if engine == 'asyncio' and workers:
+            sys.exit("--workers is not supported by the asyncio engine, it runs in one process.")
         web_server = None
         try:
             if reloader:
-                start_reloader()
+                start_reloader([f'--threads={threads}', f'--workers={workers}', f'--reuse_port={reuse_port}',
+                                f'--engine={engine}'])
                 sys.exit()
             else:
-                web_server = HTTPServer((SERVER_HOST, SERVER_PORT), Server)
+                # the middleware pipeline is loaded once, before the first request
+                get_middlewares()
+                if engine == 'asyncio':
+                    web_server = AsyncServer((SERVER_HOST, SERVER_PORT), threads)
+                elif workers:
+                    web_server = PreforkServer((SERVER_HOST, SERVER_PORT), Server, workers, threads, reuse_port)
+                elif threads:
+                    web_server = ThreadPoolHTTPServer((SERVER_HOST, SERVER_PORT), Server, threads)
+                else:
+                    web_server = HTTPServer((SERVER_HOST, SERVER_PORT), Server)
                 print(f"Server started http://{SERVER_HOST}:{SERVER_PORT}\nType ctrl+c to stoping.")
                 web_server.serve_forever()
         except KeyboardInterrupt:
             if web_server:
                 web_server.server_close()
+        except WorkerCrashError as e:
+            web_server.server_close()
+            sys.exit(e.msg)
 
         if web_server:
             web_server.server_close()
         print("Server stopped.")
+        timings = get_timings()
+        # pre-forked workers keep their own timings, the master has none
+        if timings.enabled and timings.snapshot():
+            print(timings.report())
 
     def createapp(self, app_name: str):
         from flow.config import conf
@@ -53,6 +86,32 @@ class Command:
                         with open(appfile.filepath, 'r') as sf:
                             f.write(sf.read())
 
+    def compiletemplates(self, target: str = None):
+        """
+        Compiles the templates to python modules, which are loaded instead of the template files
+        if JINJA_ENVIRONMENT 'precompiled' setting is the target directory.
+
+        :param target: Directory of the compiled templates, by default the 'precompiled' setting.
+        """
+        from flow.config.conf import get_setting
+        from flow.http.render.render import compile_templates
+        target = target or get_setting('JINJA_ENVIRONMENT', {}).get('precompiled') or 'compiled_templates'
+        names = compile_templates(target)
+        print(f"Compiled {len(names)} templates to '{target}'.")
+
+    def collectstatic(self, manifest: str = None):
+        """
+        Fingerprints the source files by their content. {% file %} outputs the fingerprinted paths, which are sent
+        with immutable Cache-Control. Restart the server after the command.
+
+        :param manifest: Manifest file, by default STATIC_MANIFEST setting.
+        """
+        from flow.config.conf import get_setting
+        from flow.http.static import collect_static
+        manifest = manifest or get_setting('STATIC_MANIFEST', 'staticfiles.json')
+        files = collect_static(manifest)
+        print(f"Fingerprinted {len(files)} source files to '{manifest}'.")
+
     def migrate(self):
         m_models = []
         models_dict: dict[str, list[Type[Model]]] = {}
@@ -1,4 +1,5 @@
 from flow.config import templates
+from fconfig import fsettings
 from fconfig.fsettings import DATABASE
 from dataclasses import dataclass
 from enum import Enum
@@ -23,6 +24,13 @@ APP_FILES: list[TemplateFile] = [
 ]
 
 
+def get_setting(name: str, default=None):
+    """
+    Returns the setting from fsettings, or the default value if the project does not define it.
+    """
+    return getattr(fsettings, name, default)
+
+
 class DefLogTable(Enum):
     appaply = '_appaply'
     flow_tables = '_flow_tables'
@@ -7,6 +7,53 @@ TEMPLATE_EXTENSION_RELATIVE_PATH = ['flow/http/render/']
 GLOBAL_OBJ_PATH = ['']
 MIDDLEWARES_PATH = ['']
 
+# Rebuild the indexes of the template and source files when files are added or removed. Disable it in production.
+PATH_INDEX_WATCH = True
+
+# Jinja environment shared by all renders. 'auto_reload' checks templates for changes, disable it in production.
+# 'bytecode_cache' is the directory of compiled templates, None disables the cache.
+# 'precompiled' is the directory of 'compiletemplates' command, the templates are loaded from it when it exists.
+# 'template_extensions' are the extensions of the files compiled by 'compiletemplates', other files are skipped.
+JINJA_ENVIRONMENT = {
+    'auto_reload': True,
+    'cache_size': 400,
+    'bytecode_cache': '.templates_cache',
+    'precompiled': None,
+    'template_extensions': ['html', 'htm', 'xml', 'jinja', 'jinja2', 'j2'],
+}
+
+# In-memory cache of small static files with gzip/deflate variants. 'max_bytes': 0 disables the cache.
+STATIC_CACHE = {
+    'max_bytes': 32 * 1024 * 1024,
+    'max_file_size': 256 * 1024,
+}
+
+# Manifest of the fingerprinted source files created by 'collectstatic' command.
+STATIC_MANIFEST = 'staticfiles.json'
+
+# In-memory cache of the pages of routes with a cache ttl (Route.url(..., cache=60) or View.cache_ttl).
+RESPONSE_CACHE = {
+    'max_bytes': 64 * 1024 * 1024,
+}
+
+# In-memory cache of the {% cache key, ttl %} template fragments, 'ttl' is used when the tag has no ttl.
+FRAGMENT_CACHE = {
+    'max_bytes': 16 * 1024 * 1024,
+    'ttl': 300,
+}
+
+# Limits of the request forms. Uploaded files larger than 'spool_size' are stored in temporary files.
+FORM_LIMITS = {
+    'max_body_size': 100 * 1024 * 1024,
+    'max_part_size': 100 * 1024 * 1024,
+    'max_field_size': 1024 * 1024,
+    'spool_size': 1024 * 1024,
+}
+
+# Timing histograms of routing, middlewares, views, templates and writing the response.
+# The report is printed when the server is stopped.
+TIMINGS = False
+
 MIDDLEWARES = [
 
 ]
@@ -19,5 +66,13 @@ DATABASE = {
     'host': 'localhost',
     'user': 'project',
     'password': '1111',
-    'database': 'flow_db'
+    'database': 'flow_db',
+    # pool of the connections of each process: maximum number of connections, seconds to wait for a free connection,
+    # seconds before a connection is opened again and seconds of idle time before a connection is checked
+    'pool': {
+        'size': 10,
+        'timeout': 30,
+        'max_lifetime': 3600,
+        'ping_interval': 30,
+    },
 }
\ No newline at end of file
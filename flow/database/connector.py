@@ -1,5 +1,247 @@
+from contextlib import contextmanager
+from typing import Iterator
 from mysql.connector import connect, Error
 from fconfig.fsettings import DATABASE as DB
+from flow.exceptions.db_exceptions import PoolTimeoutError
+from flow.utils.timings import get_timings
+import threading
+import time
+import os
+
+"""
+Pool of database connections. Connections are opened on demand up to the pool size and reused by the queries
+of all threads of the process. The pool is created in the process that uses it, with pre-forked workers each
+worker opens its own connections.
+"""
+
+
+class _PooledConnection:
+    def __init__(self, conn):
+        self.conn = conn
+        self.created = time.monotonic()
+        self.last_used = self.created
+
+
+class ConnectionPool:
+    """
+    Thread-safe bounded pool of database connections.
+    When all connections are in use, a thread waits for a free connection up to 'timeout' seconds.
+    Connections older than 'max_lifetime' seconds are closed and opened again,
+    connections idle for more than 'ping_interval' seconds are checked before use.
+    """
+    def __init__(self, connect_kwargs: dict, size: int = 10, max_lifetime: float = 3600, ping_interval: float = 30,
+                 timeout: float = 30):
+        self.name = connect_kwargs.get('database') or ''
+        self.size = size
+        self.max_lifetime = max_lifetime
+        self.ping_interval = ping_interval
+        self.timeout = timeout
+        self._connect_kwargs = connect_kwargs
+        self._cond = threading.Condition()
+        self._idle: list[_PooledConnection] = []
+        self._opened = 0
+        self._in_use = 0
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self._peak_in_use = 0
+        self._acquired = 0
+        self._waited = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._timeouts = 0
+        self._created = 0
+        self._recycled = 0
+        self._broken = 0
+
+    @contextmanager
+    def connection(self):
+        """
+        Connection of the pool for the block. The transaction is rolled back if the block fails.
+        """
+        pooled = self.acquire()
+        broken = False
+        try:
+            yield pooled.conn
+        except BaseException:
+            broken = not self._rollback(pooled.conn)
+            raise
+        finally:
+            self.release(pooled, broken)
+
+    def acquire(self) -> _PooledConnection:
+        start = time.perf_counter()
+        deadline = start + self.timeout
+        waiting = False
+        with self._cond:
+            while True:
+                if self._idle:
+                    pooled = self._idle.pop()
+                    break
+                if self._opened < self.size:
+                    # the place of the new connection is taken before it is opened
+                    self._opened += 1
+                    pooled = None
+                    break
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeoutError(self.timeout)
+                waiting = True
+                self._cond.wait(remaining)
+            waited = time.perf_counter() - start
+            self._in_use += 1
+            self._acquired += 1
+            self._peak_in_use = max(self._peak_in_use, self._in_use)
+            self._waited += waiting
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+        timings = get_timings()
+        if timings.enabled:
+            timings.observe('db.pool_wait', self.name, waited)
+
+        try:
+            if pooled is not None:
+                pooled = self._check(pooled)
+            if pooled is None:
+                pooled = _PooledConnection(connect(**self._connect_kwargs))
+                with self._cond:
+                    self._created += 1
+        except BaseException:
+            with self._cond:
+                self._opened -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        return pooled
+
+    def release(self, pooled: _PooledConnection, broken: bool = False):
+        """
+        Returns the connection to the pool. A broken connection is closed and its place is freed.
+        """
+        now = time.monotonic()
+        recycle = not broken and now - pooled.created > self.max_lifetime
+        with self._cond:
+            self._in_use -= 1
+            if broken or recycle:
+                self._opened -= 1
+                self._broken += broken
+                self._recycled += recycle
+            else:
+                pooled.last_used = now
+                self._idle.append(pooled)
+            self._cond.notify()
+        if broken or recycle:
+            self._close(pooled.conn)
+
+    def close(self):
+        """
+        Closes the idle connections.
+        """
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._opened -= len(idle)
+        for pooled in idle:
+            self._close(pooled.conn)
+
+    def stats(self) -> dict:
+        """
+        Utilisation of the pool and time spent waiting for a connection, wait times are in seconds.
+        """
+        with self._cond:
+            return {'size': self.size, 'opened': self._opened, 'in_use': self._in_use, 'idle': len(self._idle),
+                    'utilisation': self._in_use / self.size if self.size else 0.0, 'peak_in_use': self._peak_in_use,
+                    'acquired': self._acquired, 'waited': self._waited, 'wait_total': self._wait_total,
+                    'wait_mean': self._wait_total / self._acquired if self._acquired else 0.0,
+                    'wait_max': self._wait_max, 'timeouts': self._timeouts, 'created': self._created,
+                    'recycled': self._recycled, 'broken': self._broken}
+
+    def _check(self, pooled: _PooledConnection):
+        """
+        :return: The connection or None if it was closed because of its age or a failed ping.
+        """
+        now = time.monotonic()
+        if now - pooled.created > self.max_lifetime:
+            self._close(pooled.conn)
+            with self._cond:
+                self._recycled += 1
+            return None
+        if now - pooled.last_used > self.ping_interval:
+            try:
+                pooled.conn.ping(reconnect=False)
+            except Error:
+                self._close(pooled.conn)
+                with self._cond:
+                    self._broken += 1
+                return None
+        return pooled
+
+    def _after_fork(self):
+        """
+        Connections opened before the fork belong to the parent process, the child opens its own.
+        They are dropped without closing, closing would end the session of the parent.
+        """
+        self._cond = threading.Condition()
+        self._idle = []
+        self._opened = 0
+        self._in_use = 0
+        self._reset_stats()
+
+    @staticmethod
+    def _rollback(conn) -> bool:
+        try:
+            conn.rollback()
+            return True
+        except Error:
+            return False
+
+    @staticmethod
+    def _close(conn):
+        try:
+            conn.close()
+        except Error:
+            pass
+
+
+_pools: dict[tuple, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+# databases checked by this process
+_checked_databases: set[tuple] = set()
+_db_check_lock = threading.Lock()
+
+
+def _after_fork():
+    global _pools_lock, _db_check_lock
+    _pools_lock = threading.Lock()
+    _db_check_lock = threading.Lock()
+    for pool in _pools.values():
+        pool._after_fork()
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+def get_pool(host: str, user: str, password: str, database: str) -> ConnectionPool:
+    """
+    Returns the pool of the database connections, the pool is configured by DATABASE['pool'] setting.
+    """
+    key = (host, user, password, database)
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = ConnectionPool({'host': host, 'user': user, 'password': password, 'database': database},
+                                      **DB.get('pool', {}))
+                _pools[key] = pool
+    return pool
+
+
+def get_pool_stats() -> dict[str, dict]:
+    """
+    :return: Database name -> statistics of the pool.
+    """
+    return {pool.name: pool.stats() for pool in list(_pools.values())}
 
 
 class DbConnector:
@@ -9,12 +251,13 @@ class DbConnector:
         self._user = user
         self._password = password
         self._database = database
+        self._pool = get_pool(host, user, password, database)
 
         self._db_check()
 
     def connect(self, db_connect: bool = True) -> connect:
         """
-        Connection for working with the database.
+        New connection for working with the database, the connection is not taken from the pool.
 
         :param db_connect:
         :type db_connect: bool
@@ -41,6 +284,7 @@ class DbConnector:
     def query(self, query_string: str, db_connect: bool = True, list_format=False, dictionary=False) -> list:
         """
         The method executes a database query and returns the query data.
+        Queries to the database use the connections of the pool.
 
         :param query_string: Request text.
         :param db_connect: Connection type.
@@ -48,28 +292,83 @@ class DbConnector:
         :param dictionary: Output the query result as a dictionary.
         :return: list
         """
+        if db_connect:
+            with self._pool.connection() as conn:
+                return self._execute(conn, query_string, list_format, dictionary)
+        # queries without the database are rare (database check, migrations), they are not pooled
         conn = self.connect(db_connect)
-        querydata = []
         try:
-            with conn.cursor(dictionary=dictionary) as cursor:
+            return self._execute(conn, query_string, list_format, dictionary)
+        finally:
+            conn.close()
+
+    def query_columns(self, query_string: str) -> tuple[list[str], list[tuple]]:
+        """
+        The method executes a database query and returns the column names with the rows.
+        Columns with the same name in different tables of a join are all kept.
+
+        :param query_string: Request text.
+        :return: Column names and the rows as tuples.
+        """
+        with self._pool.connection() as conn:
+            with conn.cursor() as cursor:
                 cursor.execute(query_string)
-                for data in cursor:
-                    if list_format:
-                        querydata.append(data[0])
-                    else:
-                        querydata.append(data)
+                rows = cursor.fetchall()
+                columns = list(cursor.column_names)
             conn.commit()
-        except Error as e:
-            raise e
-        conn.close()
-        if not querydata:
-            querydata = []
+        return columns, rows
+
+    def iterate(self, query_string: str, chunk_size: int = 1000, dictionary=False) -> Iterator:
+        """
+        The method executes a database query and yields the rows one by one. Rows are read with an unbuffered
+        cursor in batches of chunk_size, so the memory used does not depend on the size of the result.
+        The connection is held until the iteration ends, the connection of an unfinished iteration is closed.
+
+        :param query_string: Request text.
+        :param chunk_size: Number of rows read from the server at a time.
+        :param dictionary: Output the rows as dictionaries.
+        """
+        pooled = self._pool.acquire()
+        finished = False
+        try:
+            cursor = pooled.conn.cursor(buffered=False, dictionary=dictionary)
+            cursor.execute(query_string)
+            while rows := cursor.fetchmany(chunk_size):
+                yield from rows
+            cursor.close()
+            pooled.conn.commit()
+            finished = True
+        finally:
+            # unread rows of the unbuffered cursor would block the next query of the connection
+            self._pool.release(pooled, broken=not finished)
+
+    @staticmethod
+    def _execute(conn, query_string: str, list_format=False, dictionary=False) -> list:
+        querydata = []
+        with conn.cursor(dictionary=dictionary) as cursor:
+            cursor.execute(query_string)
+            for data in cursor:
+                if list_format:
+                    querydata.append(data[0])
+                else:
+                    querydata.append(data)
+        conn.commit()
         return querydata
 
     def get_db_name(self):
         return self._database
 
     def _db_check(self):
-        all_db_name = self.query('SHOW DATABASES', db_connect=False, list_format=True)
-        if not self._database in all_db_name:
-            self.query(f'CREATE DATABASE {self._database}', db_connect=False)
\ No newline at end of file
+        """
+        Creates the database if it does not exist. The check is made once per process.
+        """
+        key = (self._host, self._database)
+        if key in _checked_databases:
+            return
+        with _db_check_lock:
+            if key in _checked_databases:
+                return
+            all_db_name = self.query('SHOW DATABASES', db_connect=False, list_format=True)
+            if not self._database in all_db_name:
+                self.query(f'CREATE DATABASE {self._database}', db_connect=False)
+            _checked_databases.add(key)
@@ -1,4 +1,7 @@
 from enum import Enum
+import functools
+import asyncio
+import threading
 import importlib
 from fconfig.fsettings import APPS
 from flow.config import conf as cfg
@@ -11,6 +14,84 @@ from abc import ABCMeta, abstractmethod
 from flow.database.model import fields as dbfields_
 
 
+# функції, які викликаються з назвою таблиці після зміни її даних
+_table_change_handlers: list[callable] = []
+
+
+def on_table_change(handler: callable):
+    """
+    Реєструє функцію, яка викликається з назвою таблиці після create, update або delete.
+    """
+    if handler not in _table_change_handlers:
+        _table_change_handlers.append(handler)
+
+
+def table_changed(tn: str):
+    for handler in _table_change_handlers:
+        handler(tn)
+
+
+class _ModelSchema:
+    """
+    Схема моделей із лога міграцій: назва таблиці -> назва поля -> дані поля ('ftype', 'fk').
+    Завантажується одним читанням _flow_tables і _flow_fields при першому запиті в процесі
+    і оновлюється після applymigrations, тому рядки результатів не роблять запитів до лога.
+    Також зберігає класи рядків (QuerySet з __slots__), створені для стовпців таблиць.
+    """
+    def __init__(self):
+        self._tables: dict[str, dict[str, dict]] = None
+        self._row_classes: dict[tuple, type] = {}
+        self._lock = threading.Lock()
+
+    def get_fields(self, tn: str) -> dict[str, dict]:
+        tables = self._tables
+        if tables is None:
+            with self._lock:
+                if self._tables is None:
+                    self._tables = self._load()
+                tables = self._tables
+        return tables.get(tn, {})
+
+    def row_class(self, tn: str, columns: tuple[str], str_fields: list[str] = None) -> type['QuerySet']:
+        """
+        Клас рядків таблиці з цими стовпцями. Створюється один раз, значення стовпців зберігаються у __slots__.
+        """
+        key = (tn, columns, tuple(str_fields) if str_fields else None)
+        cls = self._row_classes.get(key)
+        if cls is None:
+            fields = self.get_fields(tn)
+            with self._lock:
+                cls = self._row_classes.get(key)
+                if cls is None:
+                    cls = self._row_classes[key] = _make_row_class(tn, columns, str_fields, fields)
+        return cls
+
+    def refresh(self):
+        tables = self._load()
+        with self._lock:
+            self._tables = tables
+            self._row_classes = {}
+
+    @staticmethod
+    def _load() -> dict[str, dict[str, dict]]:
+        from flow.database.query import DbQuery
+
+        query = DbQuery()
+        table_names = {}
+        for table in query.select_from(cfg.DefLogTable.flow_tables.value, 'id, tn', list_format=False, dictionary=True):
+            table_names[table['id']] = table['tn']
+        tables = {tn: {} for tn in table_names.values()}
+        for field in query.select_from(cfg.DefLogTable.flow_fields.value, 'parent_table, fname, ftype, fk',
+                                       list_format=False, dictionary=True):
+            tn = table_names.get(field['parent_table'])
+            if tn is not None:
+                tables[tn][field['fname']] = field
+        return tables
+
+
+_model_schema = _ModelSchema()
+
+
 class _DbConnGetData(metaclass=ABCMeta):
     @abstractmethod
     def all(self):
@@ -20,6 +101,18 @@ class _DbConnGetData(metaclass=ABCMeta):
     def get(self, **kwargs):
         pass
 
+    async def all_async(self):
+        """
+        all() для асинхронних шаблонів і view, запит виконується в executor циклу подій.
+        """
+        return await asyncio.get_running_loop().run_in_executor(None, self.all)
+
+    async def get_async(self, **kwargs):
+        """
+        get() для асинхронних шаблонів і view, запит виконується в executor циклу подій.
+        """
+        return await asyncio.get_running_loop().run_in_executor(None, functools.partial(self.get, **kwargs))
+
 
 class _DbConnActionData(metaclass=ABCMeta):
     @abstractmethod
@@ -28,7 +121,11 @@ class _DbConnActionData(metaclass=ABCMeta):
 
 
 class FkDbConnect(_DbConnGetData):
-    def __init__(self, tn: str, rel_table_name: str, field_data, str_fields: list[str] = None):
+    def __init__(self, tn: str, rel_table_name: str, field_data, str_fields: list[str] = None,
+                 rows: list['QuerySet'] = None):
+        """
+        :param rows: Пов'язані рядки, завантажені select_related або prefetch_related. Тоді all() не робить запиту.
+        """
         from flow.database.query import DbQuery
 
         self._str_fields = str_fields
@@ -36,13 +133,15 @@ class FkDbConnect(_DbConnGetData):
         self._tn = tn
         self.rel_table_name = rel_table_name
         self.field_data = field_data
+        self._rows = rows
 
     def __repr__(self):
         return f"FkDbConnect({self._tn})"
 
     def all(self):
+        if self._rows is not None:
+            return list(self._rows)
         queryset = []
-        self._query.select_from(self.rel_table_name, '*', f"id = {self.field_data}")
         for field in self._query.select_from(self.rel_table_name, '*', f"id = {self.field_data}",
                                              list_format=False, dictionary=True):
             queryset.append(QuerySet(field, self.rel_table_name, self._str_fields))
@@ -50,6 +149,10 @@ class FkDbConnect(_DbConnGetData):
 
     def get(self, **kwargs):
         key = list(kwargs.keys())[0]
+        if self._rows is not None:
+            for row in self._rows:
+                if str(getattr(row, key, None)) == str(kwargs[key]):
+                    return row
         return QuerySet(self._query.select_from(self.rel_table_name, '*', f"id = {self.field_data} and {key} = {kwargs[key]}",
                                                 list_format=False, dictionary=True)[0], self.rel_table_name)
 
@@ -58,45 +161,182 @@ class ModelDbConnect(_DbConnGetData, _DbConnActionData):
     """
     Підключення до конкретної таблиці бази даних.
     """
+    # кількість id в одному запиті prefetch_related
+    PREFETCH_CHUNK_SIZE = 1000
+
     def __init__(self, tn: str, str_fields: list[str]):
         from flow.database.query import DbQuery
 
         self._str_fields = str_fields
         self._query = DbQuery()
         self._tn = tn
+        self._select_related: list[str] = []
+        self._prefetch_related: list[str] = []
 
     def __repr__(self):
         return f"ModelDbConnect({self._tn})"
 
+    def select_related(self, *fields: str) -> 'ModelDbConnect':
+        """
+        Пов'язані рядки полів FK завантажуються тим самим запитом (LEFT JOIN).
+        """
+        self._get_relations(fields)
+        self._select_related.extend(fields)
+        return self
+
+    def prefetch_related(self, *fields: str) -> 'ModelDbConnect':
+        """
+        Пов'язані рядки полів FK завантажуються після рядків таблиці, одним запитом 'WHERE id IN (...)' на поле.
+        """
+        self._get_relations(fields)
+        self._prefetch_related.extend(fields)
+        return self
+
     def all(self):
-        queryset = []
-        for field in self._query.select_from(self._tn, '*', list_format=False, dictionary=True):
-            queryset.append(QuerySet(field, self._tn, self._str_fields))
-        return queryset
+        return self._select()
+
+    def iterator(self, chunk_size: int = 1000):
+        """
+        Ітерація по всіх рядках таблиці без завантаження їх у пам'ять. Рядки читаються з сервера пакетами
+        по chunk_size, QuerySet створюється для кожного рядка під час ітерації.
+        select_related і prefetch_related не застосовуються, поля FK завантажуються при зверненні.
+        """
+        for field in self._query.iterate_select(self._tn, '*', chunk_size=chunk_size):
+            yield QuerySet(field, self._tn, self._str_fields)
 
     def get(self, **kwargs):
         key = list(kwargs.keys())[0]
-        data = self._query.select_from(self._tn, '*', f"{key} = {kwargs[key]}", list_format=False, dictionary=True)
-        if data:
-            data = data[0]
-        return QuerySet(data, self._tn, self._str_fields)
+        queryset = self._select(f"`{self._tn}`.`{key}` = {kwargs[key]}")
+        if queryset:
+            return queryset[0]
+        return QuerySet([], self._tn, self._str_fields)
 
     def create(self, **kwargs):
-        self._query.insert_data(self._tn, insert_values_to_str(**kwargs))
+        get_manager(self._tn).create(**kwargs)
+
+    def _select(self, where: str = '') -> list['QuerySet']:
+        if self._select_related:
+            relations = self._get_relations(self._select_related)
+            data = self._query.select_joined(self._tn, relations, where)
+            related_rows = []
+            for fields, related in data:
+                related_rows.append({fk: QuerySet(rel_fields, relations[fk]) if rel_fields is not None else None
+                                     for fk, rel_fields in related.items()})
+            data = [fields for fields, _ in data]
+        else:
+            data = self._query.select_from(self._tn, '*', where, list_format=False, dictionary=True)
+            related_rows = [{} for _ in data]
+
+        for fk, rel_table_name in self._get_relations(self._prefetch_related).items():
+            rows_by_id = self._prefetch(rel_table_name, {fields[fk] for fields in data if fields[fk] is not None})
+            for fields, related in zip(data, related_rows):
+                related[fk] = rows_by_id.get(fields[fk])
+
+        queryset = []
+        for fields, related in zip(data, related_rows):
+            row = QuerySet(fields, self._tn, self._str_fields)
+            if related:
+                row._set_related(related)
+            queryset.append(row)
+        return queryset
+
+    def _get_relations(self, fields) -> dict[str, str]:
+        """
+        :return: Поле FK -> назва пов'язаної таблиці.
+        """
+        from flow.exceptions.db_exceptions import RelatedFieldError
+
+        schema = _model_schema.get_fields(self._tn)
+        relations = {}
+        for field in fields:
+            ftype = schema.get(field)
+            if ftype is None or ftype['ftype'] != dbfields_.FieldType.FK.value:
+                raise RelatedFieldError(field, self._tn)
+            relations[field] = ftype['fk'].lower()
+        return relations
+
+    def _prefetch(self, rel_table_name: str, ids: set) -> dict[object, 'QuerySet']:
+        rows_by_id = {}
+        ids = sorted(ids)
+        for i in range(0, len(ids), self.PREFETCH_CHUNK_SIZE):
+            values = ', '.join(str(fid) for fid in ids[i:i + self.PREFETCH_CHUNK_SIZE])
+            for fields in self._query.select_from(rel_table_name, '*', f"id IN ({values})",
+                                                  list_format=False, dictionary=True):
+                rows_by_id[fields['id']] = QuerySet(fields, rel_table_name)
+        return rows_by_id
+
+
+class ModelManager:
+    """
+    Запити зміни даних таблиці. Один менеджер на таблицю, спільний для всіх рядків.
+    """
+    def __init__(self, tn: str):
+        self.tn = tn
+        self._query = None
+
+    def __repr__(self):
+        return f"ModelManager({self.tn})"
+
+    @property
+    def query(self):
+        if self._query is None:
+            from flow.database.query import DbQuery
+
+            self._query = DbQuery()
+        return self._query
+
+    def create(self, **kwargs):
+        self.query.insert_data(self.tn, insert_values_to_str(**kwargs))
+        table_changed(self.tn)
+
+    def update(self, row_id, **kwargs):
+        self.query.update_data(self.tn, update_value_to_str(**kwargs), f"id={row_id}")
+        table_changed(self.tn)
+
+    def delete(self, row_id):
+        self.query.delete_field(self.tn, f"id={row_id}")
+        table_changed(self.tn)
+
+
+_managers: dict[str, ModelManager] = {}
+_managers_lock = threading.Lock()
+
+
+def get_manager(tn: str) -> ModelManager:
+    manager = _managers.get(tn)
+    if manager is None:
+        with _managers_lock:
+            manager = _managers.get(tn)
+            if manager is None:
+                manager = _managers[tn] = ModelManager(tn)
+    return manager
 
 
 class QuerySet:
     """
     Результат запиту до бази даних. Представляє один рядок таблиці.
+    QuerySet(field, table_name) створює рядок класу, згенерованого для стовпців таблиці (_ModelSchema.row_class).
+    Значення стовпців зберігаються у __slots__, назва таблиці і менеджер - атрибути класу,
+    тому рядок не має власного словника і підключень до бази даних.
     """
-    def __init__(self, field: dict, table_name: str, str_fields: list[str] = None):
-        from flow.database.query import DbQuery
+    __slots__ = ()
 
-        self._str_fields = str_fields
-        self._query = DbQuery()
-        self.table_name = table_name
-        self._field = field
-        self._set_fields()
+    table_name: str = ''
+    _str_fields: list[str] = None
+    _columns: tuple[str] = ()
+    # назви слотів стовпців, поле FK зберігається у слоті '_fk<індекс>', пов'язані рядки FK - у слоті '_related'
+    _slots: tuple[str] = ()
+    _manager: ModelManager = None
+
+    def __new__(cls, field: dict, table_name: str = '', str_fields: list[str] = None):
+        if cls is QuerySet:
+            cls = _model_schema.row_class(table_name, tuple(field), str_fields)
+        return super(QuerySet, cls).__new__(cls)
+
+    def __init__(self, field: dict, table_name: str = '', str_fields: list[str] = None):
+        for slot, column in zip(self._slots, self._columns):
+            object.__setattr__(self, slot, field[column])
+        object.__setattr__(self, '_related', None)
 
     def __repr__(self):
         if self._str_fields:
@@ -109,21 +349,50 @@ class QuerySet:
             return f"QuerySet[{fstr}]"
         return f"QuerySet[{self.table_name}]"
 
-    def _set_fields(self):
-        for f in self._field:
-            ptid = self._query.select_from(cfg.DefLogTable.flow_tables.value, 'id', f"tn = '{self.table_name}'")[0]
-            ftype = self._query.select_from(cfg.DefLogTable.flow_fields.value, 'ftype, fk', f"fname = '{f}' and parent_table = {ptid}",
-                                            list_format=False, dictionary=True)[0]
-            if ftype['ftype'] == dbfields_.FieldType.FK.value:
-                self.__setattr__(f, FkDbConnect(self.table_name, ftype['fk'], self._field[f]))
-            else:
-                self.__setattr__(f, self._field[f])
+    def _set_related(self, related: dict[str, 'QuerySet']):
+        """
+        :param related: Поле FK -> пов'язаний рядок або None, завантажені select_related або prefetch_related.
+        """
+        object.__setattr__(self, '_related', related)
 
     def update(self, **kwargs):
-        self._query.update_data(self.table_name, update_value_to_str(**kwargs), f"id={self.id}")
+        self._manager.update(self.id, **kwargs)
 
     def delete(self):
-        self._query.delete_field(self.table_name, f"id={self.id}")
+        self._manager.delete(self.id)
+
+
+def _fk_property(tn: str, rel_table_name: str, slot: str, column: str) -> property:
+    def get_fk(row: QuerySet):
+        if row._related is not None and column in row._related:
+            rel_row = row._related[column]
+            return FkDbConnect(tn, rel_table_name, getattr(row, slot), rows=[rel_row] if rel_row is not None else [])
+        return FkDbConnect(tn, rel_table_name, getattr(row, slot))
+
+    def set_fk(row: QuerySet, value):
+        object.__setattr__(row, slot, value)
+
+    return property(get_fk, set_fk)
+
+
+def _make_row_class(tn: str, columns: tuple[str], str_fields: list[str], fields: dict[str, dict]) -> type[QuerySet]:
+    """
+    Створює підклас QuerySet з __slots__ для стовпців. Поле FK - властивість, яка повертає FkDbConnect.
+    """
+    slots = []
+    attrs = {}
+    for index, column in enumerate(columns):
+        ftype = fields.get(column)
+        if ftype is not None and ftype['ftype'] == dbfields_.FieldType.FK.value:
+            slot = f'_fk{index}'
+            # таблиці моделей створюються з назвою в нижньому регістрі, як і в select_related
+            attrs[column] = _fk_property(tn, ftype['fk'].lower(), slot, column)
+        else:
+            slot = column
+        slots.append(slot)
+    attrs.update(__slots__=tuple(slots) + ('_related',), table_name=tn, _str_fields=str_fields, _columns=columns,
+                 _slots=tuple(slots), _manager=get_manager(tn))
+    return type(f'QuerySet_{tn}', (QuerySet,), attrs)
 
 
 class Model:
@@ -942,6 +1211,8 @@ class ApplyMigrations:
             for tn in fkc:
                 self.apply_fk(tn, fkc[tn])
 
+        _model_schema.refresh()
+
     def _create_table(self, table: dict, fields: list[dict]):
         """
         Створення нової таблиці і полів да неї.
@@ -1,4 +1,9 @@
 from flow.database.connector import DbConnector
+from flow.database.model.models import on_table_change
+from flow.utils.singleflight import SingleFlight
+
+# concurrent identical selects are sent to the database once
+_select_flight = SingleFlight()
 
 
 class DbQuery:
@@ -8,8 +13,11 @@ class DbQuery:
     def __init__(self):
         # The object to send the request.
         # Returns the response as a list or an empty list.
-        self._query = DbConnector().query
-        self._db_name = DbConnector().get_db_name()
+        connector = DbConnector()
+        self._query = connector.query
+        self._iterate = connector.iterate
+        self._query_columns = connector.query_columns
+        self._db_name = connector.get_db_name()
 
     def get_db_name(self):
         return self._db_name
@@ -46,9 +54,55 @@ class DbQuery:
 
     def select_from(self, table_name, select_field: str, where: str = '', list_format=True, dictionary=False):
         if where:
-            return self._query(f"SELECT {select_field} FROM `{table_name}` WHERE {where};", list_format=list_format, dictionary=dictionary)
+            query = f"SELECT {select_field} FROM `{table_name}` WHERE {where};"
+        else:
+            query = f"SELECT {select_field} FROM `{table_name}`;"
+        data, shared = _select_flight.do((table_name, self._db_name, query, list_format, dictionary), self._query,
+                                         query, list_format=list_format, dictionary=dictionary)
+        if shared:
+            # rows of the shared result are not shared between the callers
+            data = [dict(row) if dictionary else row for row in data]
+        return data
+
+    def iterate_select(self, table_name, select_field: str, where: str = '', chunk_size: int = 1000, dictionary=True):
+        """
+        select_from for large tables, rows are read lazily in batches of chunk_size.
+        """
+        if where:
+            query = f"SELECT {select_field} FROM `{table_name}` WHERE {where};"
         else:
-            return self._query(f"SELECT {select_field} FROM `{table_name}`;", list_format=list_format, dictionary=dictionary)
+            query = f"SELECT {select_field} FROM `{table_name}`;"
+        return self._iterate(query, chunk_size, dictionary)
+
+    def select_joined(self, table_name, relations: dict[str, str], where: str = '') -> list[tuple[dict, dict]]:
+        """
+        Select of the table rows with the rows of the related tables in one query (LEFT JOIN on the FK fields).
+
+        :param relations: FK field -> related table.
+        :return: For every row the row data and FK field -> related row data, None if the FK is not set.
+        """
+        select_fields = [f"`{table_name}`.*"]
+        joins = []
+        for fk, rel_table_name in relations.items():
+            # the marker column separates the columns of the related tables
+            select_fields.append(f"NULL AS `__{fk}`")
+            select_fields.append(f"`_rel_{fk}`.*")
+            joins.append(f"LEFT JOIN `{rel_table_name}` AS `_rel_{fk}` ON `_rel_{fk}`.`id` = `{table_name}`.`{fk}`")
+        query = f"SELECT {', '.join(select_fields)} FROM `{table_name}` {' '.join(joins)}"
+        if where:
+            query += f" WHERE {where}"
+        columns, rows = self._query_columns(query + ';')
+
+        bounds = [columns.index(f"__{fk}") for fk in relations] + [len(columns)]
+        data = []
+        for row in rows:
+            fields = dict(zip(columns[:bounds[0]], row[:bounds[0]]))
+            related = {}
+            for i, fk in enumerate(relations):
+                rel_fields = dict(zip(columns[bounds[i] + 1:bounds[i + 1]], row[bounds[i] + 1:bounds[i + 1]]))
+                related[fk] = rel_fields if rel_fields.get('id') is not None else None
+            data.append((fields, related))
+        return data
 
     def update_data(self, table_name, values: str, where: str):
         self._query(f"UPDATE `{table_name}` SET {values} WHERE {where}")
@@ -70,3 +124,13 @@ class DbQuery:
 
     def delete_relation(self, table_name, relation_name):
         self._query(f'ALTER TABLE {self._db_name}.{table_name} DROP FOREIGN KEY {relation_name}')
+
+
+def _forget_table_selects(table_name: str):
+    """
+    Selects started before the table was changed are not shared with the next selects of the table.
+    """
+    _select_flight.forget(lambda key: key[0] == table_name)
+
+
+on_table_change(_forget_table_selects)
@@ -0,0 +1,13 @@
+from flow.exceptions.base import FlowException
+
+
+class PoolTimeoutError(FlowException):
+    def __init__(self, timeout: float):
+        self.msg = f"No free database connection in the pool after {timeout} seconds."
+        super(PoolTimeoutError, self).__init__(self.msg)
+
+
+class RelatedFieldError(FlowException):
+    def __init__(self, field: str, table_name: str):
+        self.msg = f"Field '{field}' of the table '{table_name}' is not a ForeignKey field."
+        super(RelatedFieldError, self).__init__(self.msg)
@@ -17,3 +17,49 @@ class RedirectError(FlowException):
     def __init__(self, path: str):
         self.msg = f"Redirect url '{path}' not found."
         super(RedirectError, self).__init__(self.msg)
+
+
+class RouteError(FlowException):
+    def __init__(self, path: str, reason: str):
+        self.msg = f"Route '{path}' is not valid: {reason}."
+        super(RouteError, self).__init__(self.msg)
+
+
+class UrlNotFoundError(FlowException):
+    def __init__(self, name: str):
+        self.msg = f"Url with name '{name}' not found."
+        super(UrlNotFoundError, self).__init__(self.msg)
+
+
+class RangeNotSatisfiableError(FlowException):
+    def __init__(self, size: int):
+        self.size = size
+        self.msg = f"Requested range is outside the file of {size} bytes."
+        super(RangeNotSatisfiableError, self).__init__(self.msg)
+
+
+class FormSizeError(FlowException):
+    def __init__(self, limit: int):
+        self.msg = f"Form is larger than the limit of {limit} bytes."
+        super(FormSizeError, self).__init__(self.msg)
+
+
+class FormParseError(FlowException):
+    def __init__(self, msg: str = None):
+        if msg:
+            self.msg = msg
+        else:
+            self.msg = 'Form parsing error.'
+        super(FormParseError, self).__init__(self.msg)
+
+
+class SourceFileNotFoundError(FlowException):
+    def __init__(self, filepath: str):
+        self.msg = f"Source file '{filepath}' not found in SOURCEFILES_PATH."
+        super(SourceFileNotFoundError, self).__init__(self.msg)
+
+
+class WorkerCrashError(FlowException):
+    def __init__(self, crashes: int, period: float):
+        self.msg = f"Workers crashed {crashes} times in {period:g} seconds, the server is stopped."
+        super(WorkerCrashError, self).__init__(self.msg)
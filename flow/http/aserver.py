@@ -0,0 +1,305 @@
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate
+from http import HTTPStatus
+import http.client
+import traceback
+import asyncio
+import io
+from flow.http.request import Request
+from flow.http import dispatch, forms
+from flow.utils.singleflight import AsyncSingleFlight
+from flow.http.static import find_static_file, get_cached_response
+from flow.utils.timings import get_timings
+from flow.exceptions.http_exceptions import RangeNotSatisfiableError, FormSizeError, FormEnctypeError, FormParseError
+
+
+class AsyncServer:
+    """
+    Http server built on asyncio streams.
+    Idle keep-alive connections do not hold a thread. Views with 'async def render' run in the event loop,
+    other views, middlewares and file reads run in the executor.
+    """
+    def __init__(self, server_address: tuple, threads: int = 0, keepalive_timeout: int = 75, backlog: int = 1024):
+        """
+        :param server_address: Host and port of the server.
+        :param threads: Number of executor threads for synchronous views. With 0, the asyncio default is used.
+        :param keepalive_timeout: Seconds an idle keep-alive connection stays open.
+        :param backlog: Listen backlog of the server socket.
+        """
+        self.server_address = server_address
+        self.threads = threads
+        self.keepalive_timeout = keepalive_timeout
+        self.backlog = backlog
+        self._render_flight = AsyncSingleFlight()
+        self._executor: ThreadPoolExecutor = None
+
+    def serve_forever(self):
+        asyncio.run(self._serve())
+
+    def server_close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    async def _serve(self):
+        if self.threads:
+            self._executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix='flow-worker')
+            asyncio.get_running_loop().set_default_executor(self._executor)
+        host, port = self.server_address
+        server = await asyncio.start_server(self._handle_connection, host, port, backlog=self.backlog)
+        async with server:
+            await server.serve_forever()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    request_line = await asyncio.wait_for(reader.readline(), self.keepalive_timeout)
+                except asyncio.TimeoutError:
+                    break
+                except ValueError:
+                    # the line is longer than the limit of the stream
+                    await self._send_error(writer, 414, 'Request-URI too long', False)
+                    break
+                if not request_line:
+                    break
+                if not request_line.strip():
+                    continue
+                try:
+                    method, path, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    await self._send_error(writer, 400, 'Bad request', False)
+                    break
+                try:
+                    headers = await self._read_headers(reader)
+                except (ValueError, http.client.HTTPException):
+                    await self._send_error(writer, 431, 'Request header fields too large', False)
+                    break
+                keep_alive = self._keep_alive(version, headers)
+                keep_alive = await self._handle_request(reader, writer, method, path, version, headers, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _read_headers(reader: asyncio.StreamReader) -> http.client.HTTPMessage:
+        lines = []
+        while True:
+            line = await reader.readline()
+            lines.append(line)
+            if line in (b'\r\n', b'\n', b''):
+                break
+            if len(lines) > http.client._MAXHEADERS:
+                raise http.client.HTTPException('Got more than 100 headers.')
+        return http.client.parse_headers(io.BytesIO(b''.join(lines)))
+
+    @staticmethod
+    def _keep_alive(version: str, headers: http.client.HTTPMessage) -> bool:
+        connection = (headers.get('Connection') or '').lower()
+        if version == 'HTTP/1.1':
+            return connection != 'close'
+        return connection == 'keep-alive'
+
+    async def _handle_request(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, method: str,
+                              path: str, version: str, headers, keep_alive: bool) -> bool:
+        """
+        :return: Whether the connection can be kept alive.
+        """
+        loop = asyncio.get_running_loop()
+        request = Request(path, method, headers)
+        try:
+            middlewares = dispatch.get_middlewares()
+            match method:
+                case 'GET':
+                    await self._discard_body(reader, headers)
+                    if path.rfind('.') != -1:
+                        with get_timings().time('write', 'static'):
+                            await self._send_static_file(writer, path, headers, keep_alive)
+                        return keep_alive
+                    page_found, slug_value = await loop.run_in_executor(None, dispatch.find_route, request,
+                                                                        middlewares)
+                case 'POST':
+                    try:
+                        await self._read_form(reader, request, headers)
+                    except FormSizeError as e:
+                        await self._send_error(writer, 413, str(e), False)
+                        return False
+                    except FormEnctypeError as e:
+                        await self._send_error(writer, 415, str(e), False)
+                        return False
+                    except FormParseError as e:
+                        await self._send_error(writer, 400, str(e), False)
+                        return False
+                    page_found, slug_value = await loop.run_in_executor(None, dispatch.find_post_route, request,
+                                                                        middlewares)
+                case _:
+                    await self._send_error(writer, 501, f'Unsupported method ({method})', False)
+                    return False
+
+            if not page_found:
+                await self._send_error(writer, 404, 'Page not found', keep_alive)
+                return keep_alive
+            if request.page is not None:
+                html_page = request.page
+            elif (cached_page := dispatch.get_cached_page(request)) is not None:
+                html_page = cached_page
+            else:
+                html_page = await self._render_view(request, slug_value)
+            await loop.run_in_executor(None, dispatch.run_after_middlewares, request, middlewares)
+
+            header = request.url_obj.header
+            if header[0] == 'Content-type':
+                header = ('Content-type', dispatch.get_mimetype(path) or 'text/html')
+            with get_timings().time('write', request.url_obj.name):
+                if dispatch.is_streamed(html_page):
+                    return await self._send_stream(writer, request.url_obj.code, [header], html_page,
+                                                   keep_alive and version == 'HTTP/1.1', version == 'HTTP/1.1')
+                await self._send_response(writer, request.url_obj.code, [header], dispatch.encode_page(html_page),
+                                          keep_alive)
+            return keep_alive
+        except ConnectionError:
+            raise
+        except Exception:
+            traceback.print_exc()
+            await self._send_error(writer, 500, 'Internal server error', False)
+            return False
+        finally:
+            request.close()
+
+    async def _render_view(self, request: Request, slug_value):
+        """
+        Calls the view of the request route. Concurrent misses of the same cached page call the view once.
+        """
+        if not dispatch.get_cache_ttl(request):
+            return await self._call_view(request, slug_value)
+        page, shared = await self._render_flight.do(dispatch.get_cache_key(request), self._call_view, request,
+                                                    slug_value)
+        if shared and dispatch.is_streamed(page):
+            page = await self._call_view(request, slug_value)
+        return page
+
+    @staticmethod
+    async def _call_view(request: Request, slug_value):
+        if slug_value is not None:
+            page = await request.url_obj.handler.call_async(request, slug_value=slug_value)
+        else:
+            page = await request.url_obj.handler.call_async(request)
+        return dispatch.cache_page(request, page)
+
+    @staticmethod
+    async def _read_form(reader: asyncio.StreamReader, request: Request, headers):
+        """
+        Reads the request body in chunks and parses the form.
+        """
+        limits = forms.FormLimits.from_settings()
+        parser = forms.get_form_parser(headers.get('Content-Type'), limits)
+        remaining = forms.get_content_length(headers, limits)
+        while remaining:
+            chunk = await reader.read(min(forms.CHUNK_SIZE, remaining))
+            if not chunk:
+                raise FormParseError('Request body is incomplete.')
+            remaining -= len(chunk)
+            parser.feed(chunk)
+        parser.close()
+        dispatch.set_parsed_form(request, parser)
+
+    @staticmethod
+    async def _discard_body(reader: asyncio.StreamReader, headers):
+        remaining = int(headers.get('Content-Length') or 0)
+        while remaining > 0:
+            chunk = await reader.read(min(forms.CHUNK_SIZE, remaining))
+            if not chunk:
+                raise asyncio.IncompleteReadError(b'', remaining)
+            remaining -= len(chunk)
+
+    async def _send_static_file(self, writer: asyncio.StreamWriter, path: str, headers, keep_alive: bool):
+        """
+        Sends the static file with loop.sendfile, the file is not read into memory.
+        """
+        file = find_static_file(path)
+        if not file:
+            await self._send_error(writer, 404, 'File not found', keep_alive)
+            return
+        if file.is_not_modified(headers):
+            await self._send_headers(writer, 304, file.get_validator_headers(), keep_alive)
+            return
+        try:
+            byte_range = file.get_range(headers)
+        except RangeNotSatisfiableError as e:
+            await self._send_headers(writer, 416, [('Content-Range', f'bytes */{e.size}'), ('Content-Length', '0')],
+                                     keep_alive)
+            return
+        if not byte_range:
+            cached_response = await asyncio.get_running_loop().run_in_executor(None, get_cached_response, file, headers)
+            if cached_response:
+                response_headers, body = cached_response
+                await self._send_headers(writer, 200, response_headers, keep_alive, body)
+                return
+        if byte_range:
+            await self._send_headers(writer, 206, file.get_headers(byte_range), keep_alive)
+            offset, count = byte_range[0], byte_range[1] - byte_range[0] + 1
+        else:
+            await self._send_headers(writer, 200, file.get_headers(), keep_alive)
+            offset, count = 0, file.size
+        with open(file.path, 'rb') as f:
+            await asyncio.get_running_loop().sendfile(writer.transport, f, offset, count)
+
+    async def _send_error(self, writer: asyncio.StreamWriter, code: int, message: str, keep_alive: bool):
+        body = bytes(f'<html><body><h1>{code}</h1><p>{message}</p></body></html>', 'utf-8')
+        await self._send_response(writer, code, [('Content-Type', 'text/html')], body, keep_alive)
+
+    async def _send_response(self, writer: asyncio.StreamWriter, code: int, headers: list[tuple], body: bytes,
+                             keep_alive: bool):
+        await self._send_headers(writer, code, headers + [('Content-Length', str(len(body)))], keep_alive, body)
+
+    async def _send_stream(self, writer: asyncio.StreamWriter, code: int, headers: list[tuple], page,
+                           keep_alive: bool, chunked: bool) -> bool:
+        """
+        Sends the streamed page while it is rendered. Parts of a synchronous iterator are rendered in the executor.
+
+        :param chunked: Send the body with chunked encoding, otherwise the end of the body is the connection close.
+        :return: Whether the connection can be kept alive.
+        """
+        if chunked:
+            headers = headers + [('Transfer-Encoding', 'chunked')]
+        await self._send_headers(writer, code, headers, keep_alive)
+        try:
+            if hasattr(page, '__aiter__'):
+                async for chunk in dispatch.aiter_chunks(page):
+                    await self._write_chunk(writer, chunk, chunked)
+            else:
+                loop = asyncio.get_running_loop()
+                chunks = dispatch.iter_chunks(page)
+                while (chunk := await loop.run_in_executor(None, next, chunks, None)) is not None:
+                    await self._write_chunk(writer, chunk, chunked)
+        except ConnectionError:
+            raise
+        except Exception:
+            # the headers are sent, the client sees the response without the last chunk
+            traceback.print_exc()
+            return False
+        if chunked:
+            await self._write_chunk(writer, b'', chunked)
+        return keep_alive
+
+    @staticmethod
+    async def _write_chunk(writer: asyncio.StreamWriter, chunk: bytes, chunked: bool):
+        if chunked:
+            writer.write(b'%x\r\n%b\r\n' % (len(chunk), chunk))
+        else:
+            writer.write(chunk)
+        await writer.drain()
+
+    @staticmethod
+    async def _send_headers(writer: asyncio.StreamWriter, code: int, headers: list[tuple], keep_alive: bool,
+                            body: bytes = b''):
+        lines = [f'HTTP/1.1 {code} {HTTPStatus(code).phrase}',
+                 f'Date: {formatdate(usegmt=True)}',
+                 f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        for name, value in headers:
+            lines.append(f'{name}: {value}')
+        writer.write(bytes('\r\n'.join(lines) + '\r\n\r\n', 'latin-1') + body)
+        await writer.drain()
@@ -0,0 +1,133 @@
+from collections import OrderedDict
+from flow.config.conf import get_setting
+from flow.database.model.models import on_table_change
+import threading
+import time
+
+"""
+Full-page response cache and template fragment cache. Pages of the routes with a cache ttl are kept in memory
+and sent without running the view. A page is removed when its ttl expires, or when a model table the view depends
+on is changed with ModelDbConnect.create, QuerySet.update or QuerySet.delete.
+Each process has its own cache, a change made in one worker process does not invalidate other workers,
+their pages stay until the ttl.
+"""
+
+
+class _CachedPage:
+    def __init__(self, body: bytes, size: int, expires: float, tables: list[str]):
+        self.body = body
+        self.size = size
+        self.expires = expires
+        self.tables = tables
+
+
+class ResponseCache:
+    """
+    Bounded LRU cache of the rendered pages or template fragments with a ttl for every entry.
+    """
+    def __init__(self, max_bytes: int, default_ttl: int = 300):
+        """
+        :param max_bytes: Maximum size of all cached pages.
+        :param default_ttl: Seconds an entry is cached if its ttl is not set.
+        """
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self._pages: OrderedDict[tuple, _CachedPage] = OrderedDict()
+        # table name -> keys of the pages that depend on the table
+        self._tables: dict[str, set[tuple]] = {}
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple):
+        """
+        :return: Cached page or None if the page is not cached or expired.
+        """
+        with self._lock:
+            page = self._pages.get(key)
+            if page is None:
+                return None
+            if page.expires <= time.monotonic():
+                self._remove(key)
+                return None
+            self._pages.move_to_end(key)
+            return page.body
+
+    def set(self, key: tuple, body, ttl: int, tables: list[str] = None):
+        """
+        :param ttl: Seconds the page is cached.
+        :param tables: Tables the page depends on.
+        """
+        # str fragments are counted in utf-8 bytes, not in characters
+        size = len(body.encode()) if isinstance(body, str) else len(body)
+        if size > self.max_bytes:
+            return
+        tables = tables or []
+        with self._lock:
+            self._remove(key)
+            self._pages[key] = _CachedPage(body, size, time.monotonic() + ttl, tables)
+            self._size += size
+            for table in tables:
+                self._tables.setdefault(table, set()).add(key)
+            while self._size > self.max_bytes and self._pages:
+                self._remove(next(iter(self._pages)))
+
+    def invalidate_table(self, table: str):
+        """
+        Removes the pages that depend on the table.
+        """
+        with self._lock:
+            for key in self._tables.pop(table, set()):
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
+            self._tables.clear()
+            self._size = 0
+
+    def _remove(self, key: tuple):
+        page = self._pages.pop(key, None)
+        if page is None:
+            return
+        self._size -= page.size
+        for table in page.tables:
+            keys = self._tables.get(table)
+            if keys:
+                keys.discard(key)
+                if not keys:
+                    del self._tables[table]
+
+
+_response_cache: ResponseCache = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    """
+    Returns the response cache configured by RESPONSE_CACHE setting.
+    """
+    global _response_cache
+    if _response_cache is None:
+        with _response_cache_lock:
+            if _response_cache is None:
+                settings = get_setting('RESPONSE_CACHE', {})
+                cache = ResponseCache(settings.get('max_bytes', 64 * 1024 * 1024))
+                on_table_change(cache.invalidate_table)
+                _response_cache = cache
+    return _response_cache
+
+
+_fragment_cache: ResponseCache = None
+
+
+def get_fragment_cache() -> ResponseCache:
+    """
+    Returns the cache of {% cache %} template fragments configured by FRAGMENT_CACHE setting.
+    """
+    global _fragment_cache
+    if _fragment_cache is None:
+        with _response_cache_lock:
+            if _fragment_cache is None:
+                settings = get_setting('FRAGMENT_CACHE', {})
+                _fragment_cache = ResponseCache(settings.get('max_bytes', 16 * 1024 * 1024), settings.get('ttl', 300))
+    return _fragment_cache
@@ -0,0 +1,300 @@
+import fconfig
+import mimetypes
+import asyncio
+import threading
+from typing import Iterator, AsyncIterator
+from flow.http.request import Request
+from flow.http import forms
+from flow.routing.route import Url
+from flow.routing.router import get_router
+from flow.utils.middlewares import MiddlewarePipeline
+from flow.http.cache import get_response_cache
+from flow.utils.singleflight import SingleFlight
+from flow.utils.timings import get_timings
+from flow.exceptions.http_exceptions import MimetypeError
+
+"""
+Request handling that does not depend on the server engine. It is shared by the http.server based Server
+and the asyncio based AsyncServer.
+"""
+
+MIMETYPES = {
+    'text/html': 'html',
+    'text/css': 'css',
+    'image/jpeg': 'jpg, jpeg',
+    'text/javascript': '.js',
+    'image/x-icon': 'ico',
+}
+
+_middlewares: MiddlewarePipeline = None
+_middlewares_lock = threading.Lock()
+_render_flight = SingleFlight()
+
+# minimum size of a chunk of the streamed page
+STREAM_CHUNK_SIZE = 16 * 1024
+
+# file extension -> mimetype
+_EXTENSION_MIMETYPES: dict[str, str] = {ext[1::]: mtype for ext, mtype in mimetypes.types_map.items()}
+for _mtype, _extensions in MIMETYPES.items():
+    for _ext in _extensions.split(','):
+        _EXTENSION_MIMETYPES[_ext.strip().lstrip('.')] = _mtype
+
+
+def get_middlewares() -> MiddlewarePipeline:
+    """
+    Returns the middleware pipeline of the project. The middleware modules are imported at the first call.
+    """
+    global _middlewares
+    if _middlewares is None:
+        with _middlewares_lock:
+            if _middlewares is None:
+                _middlewares = MiddlewarePipeline.load(fconfig.fsettings.MIDDLEWARES_PATH,
+                                                       fconfig.fsettings.MIDDLEWARES)
+    return _middlewares
+
+
+def set_form(request: Request, headers, fp):
+    """
+    Reads the form of the POST request and sets it to request.POST or request.FILES.
+
+    :param headers: Request headers.
+    :param fp: File object with the request body.
+    """
+    set_parsed_form(request, forms.parse_form(headers, fp))
+
+
+def set_parsed_form(request: Request, parser):
+    """
+    Sets the fields of the parsed form to the request. All fields of a multipart form are set to request.FILES,
+    the fields that are not files are also set to request.POST.
+    """
+    if isinstance(parser, forms.MultipartParser):
+        request.FILES.set_form(parser.fields)
+        post_fields = {}
+        for name, formfiles in parser.fields.items():
+            fields = [f for f in formfiles if f.filename is None]
+            if fields:
+                post_fields[name] = fields
+        request.POST.set_form(post_fields)
+    else:
+        request.POST.set_form(parser.fields)
+
+
+def run_before_middlewares(request: Request, middlewares: MiddlewarePipeline):
+    middlewares.before_request(request)
+
+
+def run_after_middlewares(request: Request, middlewares: MiddlewarePipeline):
+    middlewares.after_request(request)
+
+
+def find_route(request: Request, middlewares: MiddlewarePipeline) -> tuple[bool, object]:
+    """
+    Finds the route of the GET request and sets it to request.url_obj and its slugs to request.slug_data.
+    Before middlewares run only for a found route, a middleware can replace the route with a redirect
+    or return the page instead of the view.
+
+    :return: Whether the route is found and the slug value.
+    """
+    with get_timings().time('routing'):
+        url, slugs = get_router().resolve(request.currurl)
+    if url is None:
+        return False, None
+    request.url_obj = url
+    request.slug_data = slugs
+    run_before_middlewares(request, middlewares)
+    if request.url_obj.redirect:
+        return True, _redirect_slug_value(request.url_obj)
+    return True, get_slug_value(slugs)
+
+
+def find_post_route(request: Request, middlewares: MiddlewarePipeline) -> tuple[bool, object]:
+    """
+    Calls the post method of the view of the request route. The redirect returned by the view is set to
+    request.url_obj. If the view does not return a redirect, the page of the route is rendered.
+    Before middlewares run first, the view is not called if a middleware returned a redirect or a page.
+
+    :return: Whether the route is found and the slug value.
+    """
+    with get_timings().time('routing'):
+        url, slugs = get_router().resolve(request.currurl)
+    if url is None:
+        return False, None
+    request.url_obj = url
+    request.slug_data = slugs
+    run_before_middlewares(request, middlewares)
+    if request.page is None and not request.url_obj.redirect:
+        redirect_url = url.handler.for_request(request).post()
+        if redirect_url:
+            request.url_obj = redirect_url
+    if request.url_obj.redirect:
+        return True, _redirect_slug_value(request.url_obj)
+    return True, get_slug_value(slugs)
+
+
+def get_slug_value(slugs: dict):
+    """
+    Returns the value of the only slug of the route, or all slugs as a dictionary if the route has several.
+    """
+    if not slugs:
+        return None
+    if len(slugs) == 1:
+        return next(iter(slugs.values()))
+    return slugs
+
+
+def _redirect_slug_value(url_obj: Url):
+    if url_obj.path.slug_f:
+        return url_obj.slug_value
+    return None
+
+
+def render_page(request: Request, slug_value):
+    """
+    :return: Page as str or bytes, or an iterator of str/bytes parts for a streamed page.
+    """
+    if request.page is not None:
+        return request.page
+    page = get_cached_page(request)
+    if page is not None:
+        return page
+    if not get_cache_ttl(request):
+        return _render_view(request, slug_value)
+    # concurrent misses of the same cached page render it once
+    page, shared = _render_flight.do(get_cache_key(request), _render_view, request, slug_value)
+    if shared and is_streamed(page):
+        page = _render_view(request, slug_value)
+    return page
+
+
+def _render_view(request: Request, slug_value):
+    if slug_value is not None:
+        page = request.url_obj.handler(request=request, slug_value=slug_value)
+    else:
+        page = request.url_obj.handler(request=request)
+    return cache_page(request, page)
+
+
+def get_cache_ttl(request: Request) -> int:
+    """
+    Returns the ttl of the page of the request route in the response cache or None if the page is not cached.
+    Only pages of GET requests are cached. The ttl of the route is used before the ttl of the view.
+    """
+    url = request.url_obj
+    if request.method != 'GET' or url.redirect or request.page is not None:
+        return None
+    ttl = url.cache if url.cache is not None else url.handler.cache_ttl
+    return ttl or None
+
+
+def get_cached_page(request: Request) -> bytes:
+    """
+    :return: Page from the response cache or None.
+    """
+    if not get_cache_ttl(request):
+        return None
+    return get_response_cache().get(get_cache_key(request))
+
+
+def cache_page(request: Request, page):
+    """
+    Puts the page rendered by the view to the response cache. Streamed pages are not cached.
+
+    :return: The page to send.
+    """
+    ttl = get_cache_ttl(request)
+    if not ttl or is_streamed(page):
+        return page
+    page = encode_page(page)
+    get_response_cache().set(get_cache_key(request), page, ttl, request.url_obj.handler.get_cache_tables())
+    return page
+
+
+def get_cache_key(request: Request) -> tuple:
+    """
+    The key of the page is the request path with the slugs and the query, and the values of the vary headers.
+    """
+    url = request.url_obj
+    vary = url.cache_vary if url.cache_vary is not None else url.handler.cache_vary
+    return (request.currurl,) + tuple((name.lower(), request.headers.get(name)) for name in vary)
+
+
+def is_streamed(page) -> bool:
+    """
+    Checks whether the page returned by the view is an iterator of parts that is sent in chunks.
+    """
+    return not isinstance(page, (str, bytes, bytearray))
+
+
+def encode_page(page) -> bytes:
+    if isinstance(page, str):
+        return bytes(page, 'utf-8')
+    return bytes(page)
+
+
+def iter_chunks(page) -> Iterator[bytes]:
+    """
+    Encodes the parts of the streamed page and joins small parts, so a chunk is not sent for every template node.
+    """
+    if hasattr(page, '__aiter__'):
+        page = _iter_async(page)
+    buffer = bytearray()
+    for part in page:
+        buffer += encode_page(part)
+        if len(buffer) >= STREAM_CHUNK_SIZE:
+            yield bytes(buffer)
+            buffer.clear()
+    if buffer:
+        yield bytes(buffer)
+
+
+def _iter_async(page) -> Iterator:
+    """
+    Iterates the async generator in its own event loop, for the server without an event loop.
+    """
+    loop = asyncio.new_event_loop()
+    iterator = page.__aiter__()
+    try:
+        while True:
+            try:
+                yield loop.run_until_complete(iterator.__anext__())
+            except StopAsyncIteration:
+                return
+    finally:
+        loop.run_until_complete(loop.shutdown_asyncgens())
+        loop.close()
+
+
+async def aiter_chunks(page) -> AsyncIterator[bytes]:
+    """
+    iter_chunks for the page returned by an async generator.
+    """
+    buffer = bytearray()
+    async for part in page:
+        buffer += encode_page(part)
+        if len(buffer) >= STREAM_CHUNK_SIZE:
+            yield bytes(buffer)
+            buffer.clear()
+    if buffer:
+        yield bytes(buffer)
+
+
+def get_mimetype(path: str):
+    if path.rfind('.') != -1:
+        filetype = path.rsplit('.', 1)[1].lower()
+        mimetype = _EXTENSION_MIMETYPES.get(filetype)
+        if mimetype is None:
+            raise MimetypeError(filetype)
+        return mimetype
+
+
+def get_source_path(path: str) -> str:
+    """
+    Returns the path of the source file relative to the project directory.
+    Source files are linked relative to the page, so the page part of the url is skipped.
+    """
+    for source_path in fconfig.fsettings.SOURCEFILES_PATH:
+        index = path.find('/' + source_path)
+        if index != -1:
+            return path[index + 1::]
+    return path.lstrip('/')
@@ -0,0 +1,248 @@
+from dataclasses import dataclass
+from email.message import Message
+from urllib.parse import parse_qsl
+import tempfile
+from flow.config.conf import get_setting
+from flow.http.request import _FormFile
+from flow.exceptions.http_exceptions import FormEnctypeError, FormSizeError, FormParseError
+
+"""
+Incremental parsers of the request body forms. Parsers get the body in chunks, so the memory used does not
+depend on the body size. Uploaded files are spooled to temporary files when they exceed the spool size.
+"""
+
+CHUNK_SIZE = 64 * 1024
+MAX_PART_HEADERS_SIZE = 16 * 1024
+
+
+@dataclass
+class FormLimits:
+    # maximum size of the request body
+    max_body_size: int = 100 * 1024 * 1024
+    # maximum size of one multipart part
+    max_part_size: int = 100 * 1024 * 1024
+    # maximum size of a form field that is not a file and of a urlencoded form, they are kept in memory
+    max_field_size: int = 1024 * 1024
+    # files larger than this size are moved from memory to a temporary file
+    spool_size: int = 1024 * 1024
+
+    @classmethod
+    def from_settings(cls) -> 'FormLimits':
+        return cls(**get_setting('FORM_LIMITS', {}))
+
+
+def parse_header(value: str) -> tuple[str, dict[str, str]]:
+    """
+    Parses a header such as Content-Type into the main value and parameters.
+    """
+    message = Message()
+    message['content-type'] = value
+    params = message.get_params()
+    if not params:
+        return '', {}
+    main, _ = params[0]
+    return main.lower(), {k.lower(): v for k, v in params[1:]}
+
+
+class UrlencodedParser:
+    """
+    Parser of 'application/x-www-form-urlencoded' forms.
+    The whole form is kept in memory, so its size is limited by max_field_size.
+    """
+    def __init__(self, limits: FormLimits):
+        self._limit = min(limits.max_field_size, limits.max_body_size)
+        self._body = bytearray()
+        self.fields: dict[str, list[_FormFile]] = {}
+
+    def feed(self, data: bytes):
+        self._body += data
+        if len(self._body) > self._limit:
+            raise FormSizeError(self._limit)
+
+    def close(self):
+        body = self._body.decode('utf-8', errors='replace')
+        for name, value in parse_qsl(body, keep_blank_values=True, encoding='utf-8', errors='replace'):
+            self.fields.setdefault(name, []).append(_FormFile(name, value=value))
+        self._body = bytearray()
+
+
+class MultipartParser:
+    """
+    Streaming parser of 'multipart/form-data' forms.
+    Only the current chunk and the part headers are kept in memory, file parts are written to spooled files.
+    """
+    def __init__(self, boundary: str, limits: FormLimits):
+        if not boundary:
+            raise FormParseError('Multipart boundary is missing.')
+        self._limits = limits
+        self._delimiter = b'\r\n--' + bytes(boundary, 'latin-1')
+        # the first delimiter may be at the start of the body, without the line break
+        self._buffer = bytearray(b'\r\n')
+        self._state = 'preamble'
+        self._part: _FormFile = None
+        self._sink = None
+        self._part_size = 0
+        self.fields: dict[str, list[_FormFile]] = {}
+
+    def feed(self, data: bytes):
+        self._buffer += data
+        while self._process():
+            pass
+
+    def close(self):
+        if self._state != 'end':
+            self._close_files()
+            raise FormParseError('Multipart form is incomplete.')
+
+    def _process(self) -> bool:
+        """
+        Processes the buffer in the current state.
+
+        :return: Whether the state was changed and the buffer should be processed again.
+        """
+        match self._state:
+            case 'preamble':
+                index = self._buffer.find(self._delimiter)
+                if index == -1:
+                    del self._buffer[:max(len(self._buffer) - len(self._delimiter) + 1, 0)]
+                    return False
+                del self._buffer[:index + len(self._delimiter)]
+                self._state = 'delimiter'
+                return True
+            case 'delimiter':
+                if len(self._buffer) < 2:
+                    return False
+                if self._buffer[:2] == b'--':
+                    self._state = 'end'
+                    self._buffer.clear()
+                    return False
+                if self._buffer[:2] != b'\r\n':
+                    raise FormParseError('Multipart delimiter is not valid.')
+                del self._buffer[:2]
+                self._state = 'headers'
+                return True
+            case 'headers':
+                index = self._buffer.find(b'\r\n\r\n')
+                if index == -1:
+                    if len(self._buffer) > MAX_PART_HEADERS_SIZE:
+                        raise FormParseError('Multipart part headers are too large.')
+                    return False
+                self._start_part(bytes(self._buffer[:index]))
+                del self._buffer[:index + 4]
+                self._state = 'body'
+                return True
+            case 'body':
+                index = self._buffer.find(self._delimiter)
+                if index == -1:
+                    # the end of the buffer can be the start of the delimiter
+                    size = len(self._buffer) - len(self._delimiter) + 1
+                    if size > 0:
+                        self._write(self._buffer[:size])
+                        del self._buffer[:size]
+                    return False
+                self._write(self._buffer[:index])
+                del self._buffer[:index + len(self._delimiter)]
+                self._finish_part()
+                self._state = 'delimiter'
+                return True
+            case _:
+                self._buffer.clear()
+                return False
+
+    def _start_part(self, raw_headers: bytes):
+        message = Message()
+        for line in raw_headers.decode('utf-8', 'replace').split('\r\n'):
+            name, _, value = line.partition(':')
+            if value:
+                message[name.strip()] = value.strip()
+        name = message.get_param('name', header='content-disposition')
+        if name is None:
+            raise FormParseError('Multipart part has no name.')
+        filename = message.get_param('filename', header='content-disposition')
+        self._part = _FormFile(name, filename, content_type=message.get_content_type())
+        self._part_size = 0
+        if filename is None:
+            self._sink = bytearray()
+        else:
+            self._sink = tempfile.SpooledTemporaryFile(max_size=self._limits.spool_size)
+
+    def _write(self, data: bytearray):
+        if not data:
+            return
+        self._part_size += len(data)
+        if self._part_size > self._limits.max_part_size:
+            self._close_files()
+            raise FormSizeError(self._limits.max_part_size)
+        if self._part.filename is None and self._part_size > self._limits.max_field_size:
+            self._close_files()
+            raise FormSizeError(self._limits.max_field_size)
+        if isinstance(self._sink, bytearray):
+            self._sink += data
+        else:
+            self._sink.write(data)
+
+    def _finish_part(self):
+        if isinstance(self._sink, bytearray):
+            self._part.value = self._sink.decode('utf-8', 'replace')
+        else:
+            self._sink.seek(0)
+            self._part.file = self._sink
+        self.fields.setdefault(self._part.inputname, []).append(self._part)
+        self._part = None
+        self._sink = None
+
+    def _close_files(self):
+        if self._sink is not None and not isinstance(self._sink, bytearray):
+            self._sink.close()
+        for formfiles in self.fields.values():
+            for formfile in formfiles:
+                formfile.close()
+
+
+def get_form_parser(content_type: str, limits: FormLimits = None):
+    """
+    Creates the parser for the Content-Type header of the request.
+    """
+    limits = limits or FormLimits.from_settings()
+    ctype, params = parse_header(content_type or '')
+    match ctype:
+        case 'multipart/form-data':
+            return MultipartParser(params.get('boundary'), limits)
+        case 'application/x-www-form-urlencoded':
+            return UrlencodedParser(limits)
+        case _:
+            raise FormEnctypeError(ctype)
+
+
+def get_content_length(headers, limits: FormLimits) -> int:
+    """
+    Returns the size of the request body. The size is checked before the body is read.
+    """
+    try:
+        length = int(headers.get('Content-Length'))
+    except (TypeError, ValueError):
+        raise FormParseError('Content-Length header is required.')
+    if length < 0:
+        raise FormParseError('Content-Length header is not valid.')
+    if length > limits.max_body_size:
+        raise FormSizeError(limits.max_body_size)
+    return length
+
+
+def parse_form(headers, fp, limits: FormLimits = None):
+    """
+    Reads the request body from the file object in chunks and parses the form.
+
+    :return: Parser with the parsed fields.
+    """
+    limits = limits or FormLimits.from_settings()
+    parser = get_form_parser(headers.get('Content-Type'), limits)
+    remaining = get_content_length(headers, limits)
+    while remaining:
+        chunk = fp.read(min(CHUNK_SIZE, remaining))
+        if not chunk:
+            raise FormParseError('Request body is incomplete.')
+        remaining -= len(chunk)
+        parser.feed(chunk)
+    parser.close()
+    return parser
@@ -1,10 +1,14 @@
-from fconfig.fsettings import TEMPLATES_PATH
 import jinja2
+import jinja2.meta
 import os
 from fconfig.fsettings import TEMPLATE_EXTENSION_RELATIVE_PATH, GLOBAL_OBJ_PATH
 import importlib
 from flow.http.render.templ_extension import BaseExtension
-from typing import Type
+from typing import Type, Iterator, AsyncIterator
+from flow.config.conf import get_setting
+from flow.utils.pathindex import get_template_index
+from flow.utils.timings import get_timings
+import threading
 
 
 class RenderPage:
@@ -17,76 +21,303 @@ class RenderPage:
         return self
 
     def render(self, **kwargs) -> str:
-        for templ in TEMPLATES_PATH:
-            filepath = os.path.join(templ, self._tempalate)
-            if os.path.exists(filepath):
-                filename = filepath[filepath.rfind('/') + 1::]
-                return _JinjaInit(filepath, filename).template_functions(self._functions).jinit(**kwargs)
-        raise 'Template not found.'
+        return self._get_jinja().jinit(**kwargs)
+
+    def stream(self, **kwargs) -> Iterator[str]:
+        """
+        Renders the template part by part with Template.generate(). The page is rendered while it is sent,
+        so the whole page is not kept in memory.
+        """
+        return self._get_jinja().jinit_stream(**kwargs)
+
+    async def render_async(self, **kwargs) -> str:
+        """
+        Renders the template in the async environment. Awaitables returned by the functions called in the template
+        are awaited, e.g. FkDbConnect.all_async(), so the event loop is not blocked.
+        """
+        return await self._get_jinja(is_async=True).jinit_async(**kwargs)
+
+    def stream_async(self, **kwargs) -> AsyncIterator[str]:
+        """
+        Streamed render_async(), the parts are rendered with Template.generate_async().
+        """
+        return self._get_jinja(is_async=True).jinit_stream_async(**kwargs)
+
+    def _get_jinja(self, is_async: bool = False) -> '_JinjaInit':
+        return _JinjaInit(self._tempalate, is_async).template_functions(self._functions)
 
 
 class _JinjaInit:
-    def __init__(self, filepath: str, filename: str):
-        self._path = filepath
-        self._env = jinja2.Environment(loader=self._get_loader(), extensions=self._get_extensons())
-        self._template = self._env.get_template(filename)
-        self._template_obj = []
+    def __init__(self, template: str, is_async: bool = False):
+        # the compiled template is taken from the cache of the shared environment
+        env = get_async_environment() if is_async else get_environment()
+        self._template = env.get_template(template)
+        self._functions = {}
 
     def template_functions(self, functions: list[callable]):
+        """
+        Functions of one render. They are passed with the template variables, the shared environment is not changed.
+        """
         for func in functions:
             funcname = func.__name__
-            self._env.globals[funcname] = func
+            self._functions[funcname] = func
         return self
 
-    def _get_loader(self) -> jinja2.ChoiceLoader:
-        """
-        Creates loaders for html templates.
-        """
-        fsl = []
-        for template in TEMPLATES_PATH:
-            fsl.append(jinja2.FileSystemLoader(template))
-        loader = jinja2.ChoiceLoader(fsl)
-        return loader
+    def jinit(self, **kwargs):
+        with get_timings().time('template', self._template.name):
+            render = self._template.render(self._get_context(kwargs))
+        return render
 
-    def _get_extensons(self) -> list[Type[BaseExtension]]:
-        """
-        Collects all template extensions (Classes) inherited from BaseExtension.
-        :return:
-        """
-        for path in TEMPLATE_EXTENSION_RELATIVE_PATH:
-            p = path.replace('/', '.')
-            importlib.import_module(f'{p}template_ext')
-        return BaseExtension.__subclasses__()
+    def jinit_stream(self, **kwargs) -> Iterator[str]:
+        return get_timings().timed_iter('template', self._template.name,
+                                        self._template.generate(self._get_context(kwargs)))
 
-    def _set_global_obj(self):
-        for path in GLOBAL_OBJ_PATH:
-            p = path.replace('/', '.')
-            importlib.import_module(f'{p}global_obj')
-            gtos = GlobalTemplateObject.__subclasses__()
+    async def jinit_async(self, **kwargs) -> str:
+        with get_timings().time('template', self._template.name):
+            return await self._template.render_async(self._get_context(kwargs))
 
-        for gto in gtos:
-            g = gto()
-            self._template_obj = g.objects
-            self.template_functions(g.functions)
+    def jinit_stream_async(self, **kwargs) -> AsyncIterator[str]:
+        return get_timings().timed_aiter('template', self._template.name,
+                                         self._template.generate_async(self._get_context(kwargs)))
 
-    def jinit(self, **kwargs):
-        self._set_global_obj()
-        for obj in self._template_obj:
-            kwargs[obj] = self._template_obj[obj]
-        render = self._template.render(kwargs)
-        return render
+    def _get_context(self, kwargs: dict) -> dict:
+        for funcname in self._functions:
+            kwargs.setdefault(funcname, self._functions[funcname])
+        _global_objects.set_provided(self._template, kwargs)
+        return kwargs
+
+
+class _IndexedLoader(jinja2.BaseLoader):
+    """
+    Loader of the template files of TEMPLATES_PATH. The file is found in the template index, the template
+    directories are not probed on each load.
+    """
+    def get_source(self, environment, template):
+        path = get_template_index().get(template)
+        if path is None:
+            raise jinja2.TemplateNotFound(template)
+        try:
+            with open(path, encoding='utf-8') as f:
+                source = f.read()
+            mtime = os.path.getmtime(path)
+        except OSError:
+            raise jinja2.TemplateNotFound(template)
+
+        def uptodate():
+            try:
+                return os.path.getmtime(path) == mtime
+            except OSError:
+                return False
+        return source, os.path.abspath(path), uptodate
+
+    def list_templates(self):
+        return get_template_index().names()
+
+
+def _get_loader(precompiled: str = None) -> jinja2.BaseLoader:
+    """
+    Creates loaders for html templates.
+
+    :param precompiled: Directory of the templates compiled by compiletemplates command. The compiled templates
+                        are loaded before the template files.
+    """
+    if precompiled and os.path.isdir(precompiled):
+        return jinja2.ChoiceLoader([jinja2.ModuleLoader(precompiled), _IndexedLoader()])
+    return _IndexedLoader()
+
+
+def _get_extensons() -> list[Type[BaseExtension]]:
+    """
+    Collects all template extensions (Classes) inherited from BaseExtension.
+    :return:
+    """
+    for path in TEMPLATE_EXTENSION_RELATIVE_PATH:
+        p = path.replace('/', '.')
+        importlib.import_module(f'{p}template_ext')
+    return BaseExtension.__subclasses__()
+
+
+def _get_bytecode_cache(directory: str, enable_async: bool = False) -> jinja2.FileSystemBytecodeCache:
+    if not directory:
+        return None
+    if enable_async:
+        # the cache keys do not depend on the async mode, async templates need their own directory
+        directory = os.path.join(directory, 'async')
+    os.makedirs(directory, exist_ok=True)
+    return jinja2.FileSystemBytecodeCache(directory)
+
+
+_environment: jinja2.Environment = None
+_async_environment: jinja2.Environment = None
+_environment_lock = threading.Lock()
+
+
+def get_environment() -> jinja2.Environment:
+    """
+    Returns the jinja environment shared by all renders of the process. Loaders and extensions are created once,
+    compiled templates are kept in the environment cache and in the bytecode cache between restarts.
+    The environment is configured by JINJA_ENVIRONMENT setting.
+    """
+    global _environment
+    if _environment is None:
+        with _environment_lock:
+            if _environment is None:
+                _environment = create_environment()
+    return _environment
+
+
+def get_async_environment() -> jinja2.Environment:
+    """
+    Returns the shared environment with enable_async for the renders in the event loop.
+    It has its own template cache, because async templates are compiled to different code.
+    """
+    global _async_environment
+    if _async_environment is None:
+        with _environment_lock:
+            if _async_environment is None:
+                _async_environment = create_environment(enable_async=True)
+    return _async_environment
+
+
+def create_environment(source_only: bool = False, enable_async: bool = False) -> jinja2.Environment:
+    """
+    :param source_only: Load the templates only from the template files, without the precompiled templates.
+    :param enable_async: Templates are rendered with render_async() and generate_async().
+    """
+    settings = get_setting('JINJA_ENVIRONMENT', {})
+    # templates compiled by compiletemplates are synchronous
+    precompiled = None if source_only or enable_async else settings.get('precompiled')
+    env = jinja2.Environment(loader=_get_loader(precompiled), extensions=_get_extensons(), enable_async=enable_async,
+                             auto_reload=settings.get('auto_reload', True),
+                             cache_size=settings.get('cache_size', 400),
+                             bytecode_cache=_get_bytecode_cache(settings.get('bytecode_cache'), enable_async))
+    _global_objects.load(env)
+    return env
+
+
+# extensions of the template files compiled by compiletemplates, JINJA_ENVIRONMENT['template_extensions']
+TEMPLATE_FILE_EXTENSIONS = ('html', 'htm', 'xml', 'jinja', 'jinja2', 'j2')
+
+
+def compile_templates(target: str) -> list[str]:
+    """
+    Compiles all templates of TEMPLATES_PATH to python modules in the target directory. Modules of the previous
+    compilation are removed. A template syntax error stops the compilation.
+
+    :return: Names of the compiled templates.
+    """
+    extensions = get_setting('JINJA_ENVIRONMENT', {}).get('template_extensions', TEMPLATE_FILE_EXTENSIONS)
+    env = create_environment(source_only=True)
+    names = env.list_templates(filter_func=lambda name: _is_template_file(name, extensions))
+    os.makedirs(target, exist_ok=True)
+    for filename in os.listdir(target):
+        if filename.startswith('tmpl_') and filename.endswith('.py'):
+            os.remove(os.path.join(target, filename))
+    env.compile_templates(target, filter_func=lambda name: _is_template_file(name, extensions), zip=None,
+                          ignore_errors=False)
+    return names
+
+
+def _is_template_file(name: str, extensions) -> bool:
+    """
+    Other files of TEMPLATES_PATH, such as notes or editor swap and lock files, are not compiled.
+    """
+    basename = os.path.basename(name)
+    if basename.startswith(('.', '#', '~')) or basename.endswith('~'):
+        return False
+    return os.path.splitext(basename)[1].lstrip('.') in extensions
 
 
 class GlobalTemplateObject:
     """
     The class that contains all the global template attributes.
+    Objects and functions of all subclasses are set to the environment globals once, when the environment is created.
     """
     def __init__(self):
-        self.objects = []
+        self.objects = {}
         self.functions = []
+        self.providers = {}
 
     def add_object(self, **kwargs):
-        self.objects = kwargs
+        self.objects.update(kwargs)
 
     def add_function(self, func: callable):
         self.functions.append(func)
+
+    def add_provider(self, name: str, func: callable):
+        """
+        Adds the global object whose value changes per request. The function is called once per render,
+        only for the templates that use the name.
+        """
+        self.providers[name] = func
+
+
+class _GlobalObjects:
+    """
+    Registry of the global template objects of GLOBAL_OBJ_PATH modules.
+    """
+    def __init__(self):
+        self.providers: dict[str, callable] = {}
+        # template name -> template and the names it uses with its included templates, None - unknown names
+        self._template_names: dict[str, tuple[jinja2.Template, set[str]]] = {}
+        self._lock = threading.Lock()
+
+    def load(self, env: jinja2.Environment):
+        for path in GLOBAL_OBJ_PATH:
+            p = path.replace('/', '.')
+            importlib.import_module(f'{p}global_obj')
+        for gto in GlobalTemplateObject.__subclasses__():
+            g = gto()
+            env.globals.update(g.objects)
+            for func in g.functions:
+                env.globals[func.__name__] = func
+            self.providers.update(g.providers)
+
+    def set_provided(self, template: jinja2.Template, kwargs: dict):
+        """
+        Sets the values of the providers the template uses to the render variables.
+        """
+        if not self.providers:
+            return
+        names = self._get_template_names(template)
+        for name, provider in self.providers.items():
+            if name not in kwargs and (names is None or name in names):
+                kwargs[name] = provider()
+
+    def _get_template_names(self, template: jinja2.Template) -> set[str]:
+        cached = self._template_names.get(template.name)
+        if cached and cached[0] is template:
+            return cached[1]
+        names = _find_template_names(template.environment, template.name, set())
+        with self._lock:
+            self._template_names[template.name] = (template, names)
+        return names
+
+
+def _find_template_names(env: jinja2.Environment, name: str, visited: set[str]) -> set[str]:
+    """
+    Finds the undeclared names of the template and its included, imported and extended templates.
+
+    :return: Names or None if the names can not be found, e.g. the template name is a variable.
+    """
+    if name is None:
+        return None
+    if name in visited:
+        return set()
+    visited.add(name)
+    try:
+        source, _, _ = env.loader.get_source(env, name)
+    except (RuntimeError, jinja2.TemplateNotFound):
+        # precompiled templates do not have the source
+        return None
+    ast = env.parse(source)
+    names = set(jinja2.meta.find_undeclared_variables(ast))
+    for referenced in jinja2.meta.find_referenced_templates(ast):
+        referenced_names = _find_template_names(env, referenced, visited)
+        if referenced_names is None:
+            return None
+        names |= referenced_names
+    return names
+
+
+_global_objects = _GlobalObjects()
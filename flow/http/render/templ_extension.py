@@ -10,6 +10,8 @@ class BaseExtension(Extension):
 
     # Extensiom name.
     tags = []
+    # The tag is a block closed by 'end<name>'. The handler gets the block as 'caller', caller() renders it.
+    block = False
 
     def parse(self, parser):
         lineno = parser.stream.expect(f'name:{self.tags[0]}').lineno
@@ -18,6 +20,9 @@ class BaseExtension(Extension):
             parse_expression.append(parser.parse_expression())
         #else:
         #    parse_expression.append(nodes.Const(None))
+        if self.block:
+            body = parser.parse_statements((f'name:end{self.tags[0]}',), drop_needle=True)
+            return nodes.CallBlock(self.call_method('handler', parse_expression), [], [], body).set_lineno(lineno)
         call = self.call_method('handler', parse_expression, lineno=lineno)
         return nodes.Output([nodes.MarkSafe(call)]).set_lineno(lineno)
 
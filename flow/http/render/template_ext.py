@@ -1,7 +1,10 @@
 from flow.http.render.templ_extension import BaseExtension
-from fconfig.fsettings import SOURCEFILES_PATH
-import os
-import fconfig
+from flow.routing.router import get_router
+from flow.http.cache import get_fragment_cache
+from flow.http.static import get_static_manifest
+import inspect
+from flow.utils.pathindex import get_source_index
+from flow.exceptions.http_exceptions import SourceFileNotFoundError
 
 
 class FileExt(BaseExtension):
@@ -11,12 +14,10 @@ class FileExt(BaseExtension):
     tags = ['file']
 
     def handler(self, filepath: str):
-        for path in SOURCEFILES_PATH:
-            p = os.path.join(path, filepath)
-            if os.path.exists(p):
-                return p
-            else:
-                raise 'Fila not found.'
+        path = get_source_index().get(filepath)
+        if path is None:
+            raise SourceFileNotFoundError(filepath)
+        return get_static_manifest().get_url(path)
 
 
 class UrlExt(BaseExtension):
@@ -25,8 +26,45 @@ class UrlExt(BaseExtension):
     """
     tags = ['url']
 
-    def handler(self, pathname):
-        for url in fconfig.froute.routings:
-            if pathname == url.name:
-                return url.path
-        raise 'Url not found.'
+    def handler(self, pathname, slug_value=None):
+        return get_router().reverse(pathname, slug_value)
+
+
+class CacheExt(BaseExtension):
+    """
+    Cache of the rendered template fragment.
+    {% cache key, ttl %}...{% endcache %}, the key is any template expression, e.g. ('sidebar', user.id).
+    Without the ttl, the ttl of FRAGMENT_CACHE setting is used.
+    """
+    tags = ['cache']
+    block = True
+
+    def handler(self, key, ttl=None, caller=None):
+        cache = get_fragment_cache()
+        key = _get_fragment_key(key)
+        fragment = cache.get(key)
+        if fragment is not None:
+            return fragment
+        ttl = ttl if ttl is not None else cache.default_ttl
+        fragment = caller()
+        if inspect.isawaitable(fragment):
+            # the caller of an async template renders the block in a coroutine
+            return self._set_async(cache, key, fragment, ttl)
+        cache.set(key, fragment, ttl)
+        return fragment
+
+    @staticmethod
+    async def _set_async(cache, key: tuple, fragment, ttl: int):
+        fragment = await fragment
+        cache.set(key, fragment, ttl)
+        return fragment
+
+
+def _get_fragment_key(key) -> tuple:
+    if isinstance(key, list):
+        key = tuple(key)
+    try:
+        hash(key)
+    except TypeError:
+        key = repr(key)
+    return 'fragment', key
@@ -1,54 +1,87 @@
 from dataclasses import dataclass
-import cgi
+from typing import BinaryIO
 from flow.routing.route import Url
 
 
 @dataclass
 class _FormFile:
+    """
+    Form field or uploaded file. Content of the uploaded file is available as a file object.
+    """
     inputname: str
-    filename: str
-    filedata: bytes
+    filename: str = None
+    value: str = None
+    file: BinaryIO = None
+    content_type: str = None
+
+    @property
+    def filedata(self):
+        """
+        Value of the field, or the whole content of the uploaded file.
+        """
+        if self.file is None:
+            return self.value
+        self.file.seek(0)
+        data = self.file.read()
+        self.file.seek(0)
+        return data
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
 
     def __repr__(self):
         if self.filename:
             return f"_FormFile({self.filename})"
         else:
-            return f"_FormFile({self.filedata})"
+            return f"_FormFile({self.value})"
 
 
 class _Form:
-    _form: cgi.FieldStorage = None
-
-    @classmethod
-    def get_form(cls) -> cgi.FieldStorage:
-        return cls._form
-
-    @classmethod
-    def get(cls, key, default=None) -> list[_FormFile]:
-        if isinstance(cls._form[key], list):
-            formfiles = []
-            for i in cls._form[key]:
-                formfiles.append(_FormFile(key, i.filename, i.value))
-            return formfiles
-        else:
-            return [_FormFile(key, cls._form.filename, cls._form.getvalue(key, default))]
+    def __init__(self):
+        self._form: dict[str, list[_FormFile]] = {}
 
-    @classmethod
-    def set_form(cls, form: cgi.FieldStorage):
-        cls._form = form
+    def get_form(self) -> dict[str, list[_FormFile]]:
+        return self._form
 
+    def get(self, key, default=None) -> list[_FormFile]:
+        if key in self._form:
+            return self._form[key]
+        return [_FormFile(key, value=default)]
 
-class Request:
-    currurl = ''
-    url_obj: Url = None
-    response_code = 200
-    slug_data = ''
-    path_data = None
-    aaa = '/test/'
+    def set_form(self, form: dict[str, list[_FormFile]]):
+        self._form = form
+
+    def close(self):
+        """
+        Closes the uploaded files, temporary files of large uploads are deleted.
+        """
+        for formfiles in self._form.values():
+            for formfile in formfiles:
+                formfile.close()
 
-    class FILES(_Form):
-        pass
 
-    class POST(_Form):
-        pass
+class Request:
+    """
+    The state of one http request. A new object is created for every request, so concurrent requests
+    do not share forms or the current route.
+    """
+    def __init__(self, currurl: str = '', method: str = 'GET', headers=None):
+        self.currurl = currurl
+        self.method = method
+        # request headers, http.client.HTTPMessage
+        self.headers = headers if headers is not None else {}
+        self.url_obj: Url = None
+        self.response_code = 200
+        self.slug_data = ''
+        self.path_data = None
+        self.FILES = _Form()
+        self.POST = _Form()
+        # middlewares that ran before_request
+        self.middlewares = []
+        # response set by a middleware instead of the view page
+        self.page = None
 
+    def close(self):
+        self.FILES.close()
+        self.POST.close()
@@ -1,59 +1,74 @@
-from http.server import CGIHTTPRequestHandler
-import fconfig
-import os
-import cgi
+from http.server import CGIHTTPRequestHandler, HTTPServer
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import traceback
 # from dataclasses import dataclass
 from flow.http.request import Request
-from flow.routing.route import Route, Url
-from flow.exceptions.http_exceptions import FormEnctypeError, MimetypeError
-from typing import Type
-
-import importlib
-
-
-MIMETYPES = {
-    'text/html': 'html',
-    'text/css': 'css',
-    'image/jpeg': 'jpg, jpeg',
-    'text/javascript': '.js'
-}
+from flow.http import dispatch
+from flow.http.static import find_static_file, get_cached_response
+from flow.utils.timings import get_timings
+from flow.exceptions.http_exceptions import RangeNotSatisfiableError, FormSizeError, FormEnctypeError, FormParseError
+
+
+class ThreadPoolHTTPServer(HTTPServer):
+    """
+    Http server that handles requests on a bounded pool of worker threads.
+    When all workers are busy, new connections wait in the listen backlog.
+    """
+    def __init__(self, server_address, handler_class, threads: int, bind_and_activate=True):
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='flow-worker')
+        self._free_workers = threading.BoundedSemaphore(threads)
+        super().__init__(server_address, handler_class, bind_and_activate)
+
+    def process_request(self, request, client_address):
+        self._free_workers.acquire()
+        self._executor.submit(self._process_request_worker, request, client_address)
+
+    def _process_request_worker(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self._free_workers.release()
+
+    def server_close(self):
+        super().server_close()
+        self._executor.shutdown(wait=True)
 
 
 class Server(CGIHTTPRequestHandler):
-    middlewares = []
-
     def do_GET(self):
+        self.flow_request = Request(self.path, 'GET', self.headers)
         self.get_middlewares()
         if self.path.rfind('.') != -1:
-            mimetype = self._get_mimetype()
-            path = self.path.split(Request.currurl)[-1]
-            if os.path.exists(path):
-                with open(path, 'rb') as f:
-                    file = f.read()
-                self._write_file(file, mimetype, 200, ('Content-Type', ''))
+            with get_timings().time('write', 'static'):
+                self._send_static_file()
         else:
             self._route()
 
     def do_POST(self) -> None:
+        self.flow_request = Request(self.path, 'POST', self.headers)
         self.get_middlewares()
-        ctype, pdict = cgi.parse_header(self.headers.get('Content-Type'))
-        match ctype:
-            case 'multipart/form-data':
-                pdict['boundary'] = bytes(pdict['boundary'], "utf-8")
-                Request.FILES.set_form(self._get_form())
-            case 'application/x-www-form-urlencoded':
-                Request.POST.set_form(self._get_form())
-            case _:
-                raise FormEnctypeError(ctype)
-        self._route_post()
-
-    def _get_form(self):
-        form = cgi.FieldStorage(
-            fp=self.rfile,
-            headers=self.headers,
-            environ={'REQUEST_METHOD': 'POST', 'CONTENT_TYPE': self.headers['Content-Type']}
-        )
-        return form
+        try:
+            dispatch.set_form(self.flow_request, self.headers, self.rfile)
+        except FormSizeError as e:
+            self.close_connection = True
+            self.send_error(413, str(e))
+            return
+        except FormEnctypeError as e:
+            self.close_connection = True
+            self.send_error(415, str(e))
+            return
+        except FormParseError as e:
+            self.close_connection = True
+            self.send_error(400, str(e))
+            return
+        try:
+            self._route_post()
+        finally:
+            self.flow_request.close()
 
     def _write_file(self, templatefile: bytes, mimetype: str, code: int, header: iter):
         self.send_response(code)
@@ -64,145 +79,110 @@ class Server(CGIHTTPRequestHandler):
         self.end_headers()
         self.wfile.write(templatefile)
 
+    def _send_static_file(self):
+        """
+        Sends the static file with sendfile, the file is not read into memory.
+        """
+        file = find_static_file(self.path)
+        if not file:
+            self.send_error(404, 'File not found')
+            return
+        if file.is_not_modified(self.headers):
+            self._send_headers(304, file.get_validator_headers())
+            return
+        try:
+            byte_range = file.get_range(self.headers)
+        except RangeNotSatisfiableError as e:
+            self._send_headers(416, [('Content-Range', f'bytes */{e.size}'), ('Content-Length', '0')])
+            return
+        if not byte_range:
+            cached_response = get_cached_response(file, self.headers)
+            if cached_response:
+                headers, body = cached_response
+                self._send_headers(200, headers)
+                self.wfile.write(body)
+                return
+        if byte_range:
+            self._send_headers(206, file.get_headers(byte_range))
+            offset, count = byte_range[0], byte_range[1] - byte_range[0] + 1
+        else:
+            self._send_headers(200, file.get_headers())
+            offset, count = 0, file.size
+        with open(file.path, 'rb') as f:
+            self.connection.sendfile(f, offset, count)
+
+    def _send_headers(self, code: int, headers: list[tuple[str, str]]):
+        self.send_response(code)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+
     def _get_mimetype(self):
-        if self.path.rfind('.') != -1:
-            filetype = self.path.rsplit('.')[1]
-            for mtype in MIMETYPES:
-                if filetype in MIMETYPES[mtype]:
-                    return mtype
-                if filetype == 'ico':
-                    return
-            raise MimetypeError(filetype)
+        return dispatch.get_mimetype(self.path)
 
     def _route(self):
-        self.set_request()
-        valid_path = ''
-        slug_value = None
-        page_found = False
-        Request.currurl = self.path
-        for url in fconfig.froute.routings:
-            Request.url_obj = url
-            self.run_before_middlewares()
-            if Request.url_obj.redirect:
-                # redirect
-                if Request.url_obj.path.slug_f:
-                    currpath = Request.url_obj.path.path.replace(Request.url_obj.path.slug_f,
-                                                                 str(Request.url_obj.slug_value))
-                    slug_value = Request.url_obj.slug_value
-                    valid_path = self._start_render(currpath, slug_value)
-                    if valid_path:
-                        page_found = True
-                        break
-                else:
-                    currpath = Request.url_obj.path.path
-                    valid_path = self._start_render(currpath, slug_value)
-                    if valid_path:
-                        page_found = True
-                        break
-            else:
-                # normal
-                if Request.url_obj.path.slug_f:
-                    path_data, currpath, slug_value = self._parse_path(Request.url_obj.path)
-                    valid_path = self._start_render(currpath, slug_value)
-                    if valid_path:
-                        page_found = True
-                        break
-                else:
-                    currpath = Request.url_obj.path.path
-                    valid_path = self._start_render(currpath, slug_value)
-                    if valid_path:
-                        page_found = True
-                        break
-        if not page_found:
+        page_found, slug_value = dispatch.find_route(self.flow_request, self.middlewares)
+        if page_found:
+            self._render_page(self.flow_request, slug_value)
+            self.run_after_middlewares()
+        else:
             self.send_error(404, 'Page not found')
 
-    def _start_render(self, currpath, slug_value):
-        ok = False
-        if self.path == currpath and not Request.url_obj.redirect:
-            self._render_page(Request, slug_value)
-            self.run_after_middlewares()
-            ok = True
-        elif Request.url_obj.redirect:
-            print(Request.url_obj.header)
-            self._render_page(Request, slug_value)
-            self.run_after_middlewares()
-            ok = True
-        return ok
-
-    def _render_page(self, request: Type[Request], slug_value):
-        mimetype = self._get_mimetype()
-        if slug_value:
-            self._write_file(bytes(request.url_obj.handler(request=request, slug_value=slug_value), 'utf-8'), mimetype,
-                             request.url_obj.code, request.url_obj.header)
+    def _render_page(self, request: Request, slug_value):
+        mimetype = self._get_mimetype() or 'text/html'
+        page = dispatch.render_page(request, slug_value)
+        with get_timings().time('write', request.url_obj.name):
+            if dispatch.is_streamed(page):
+                self._write_stream(page, mimetype, request.url_obj.code, request.url_obj.header)
+            else:
+                self._write_file(dispatch.encode_page(page), mimetype, request.url_obj.code, request.url_obj.header)
+
+    def _write_stream(self, page, mimetype: str, code: int, header: iter):
+        """
+        Sends the streamed page while it is rendered. HTTP/1.1 clients get a chunked response,
+        HTTP/1.0 clients get the body until the connection is closed.
+        """
+        chunked = self.request_version == 'HTTP/1.1'
+        if chunked:
+            # the server speaks HTTP/1.0, chunked encoding needs an HTTP/1.1 status line
+            self.protocol_version = 'HTTP/1.1'
+        self.send_response(code)
+        if header[0] == 'Content-type':
+            self.send_header('Content-type', mimetype)
         else:
-            self._write_file(bytes(request.url_obj.handler(request=request), 'utf-8'), mimetype,
-                             request.url_obj.code, request.url_obj.header)
+            self.send_header(header[0], header[1])
+        if chunked:
+            self.send_header('Transfer-Encoding', 'chunked')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+        try:
+            for chunk in dispatch.iter_chunks(page):
+                if chunked:
+                    self.wfile.write(b'%x\r\n%b\r\n' % (len(chunk), chunk))
+                else:
+                    self.wfile.write(chunk)
+            if chunked:
+                self.wfile.write(b'0\r\n\r\n')
+        except ConnectionError:
+            pass
+        except Exception:
+            # the headers are sent, the client sees the response without the last chunk
+            traceback.print_exc()
 
     def _route_post(self):
-        self.set_request()
-        valid_path = ''
-        page_found = False
-        slug_value = None
-        Request.currurl = self.path
-        for url in fconfig.froute.routings:
-            # post return redirect object
-            if url.handler.post():
-                Request.url_obj = url.handler.post()
-                self.run_before_middlewares()
-            if Request.url_obj.redirect:
-                # redirect
-                if Request.url_obj.path.slug_f:
-                    currpath = Request.url_obj.path.path.replace(Request.url_obj.path.slug_f,
-                                                                 str(Request.url_obj.slug_value))
-                    slug_value = Request.url_obj.slug_value
-                    valid_path = self._start_render(currpath, slug_value)
-                    if valid_path:
-                        page_found = True
-                        break
-                else:
-                    currpath = Request.url_obj.path.path
-                    valid_path = self._start_render(currpath, slug_value)
-                    if valid_path:
-                        page_found = True
-                        break
-        if not page_found:
+        page_found, slug_value = dispatch.find_post_route(self.flow_request, self.middlewares)
+        if page_found:
+            self._render_page(self.flow_request, slug_value)
+            self.run_after_middlewares()
+        else:
             self.send_error(404, 'Page not found')
 
-    def _parse_path(self, urlobj):
-        # path_data = Route.parse_path(urlobj.path)
-        path_data = urlobj
-        url_path = urlobj.path
-        slug_data = ''
-        if path_data.slug_f:
-            slug_data = self.path[path_data.left_c::]
-            slug_data = slug_data.split('/')[0]
-            url_path = path_data.path.replace(path_data.slug_f, slug_data)
-        elif urlobj.redirect:
-            if urlobj.slug_value:
-                slug_data = urlobj.slug_value
-                url_path = path_data.path.replace(path_data.slug_f, slug_data)
-        return path_data, url_path, slug_data
-
     def get_middlewares(self):
-        from flow.utils.middlewares import Middleware
-        for mddl_path in fconfig.fsettings.MIDDLEWARES_PATH:
-            for mddl_name in fconfig.fsettings.MIDDLEWARES:
-                if os.path.exists(os.path.join(mddl_path, mddl_name+'.py')):
-                    importlib.import_module(f'{mddl_path.replace("/", ".")}{mddl_name}')
-                    for i in Middleware.__subclasses__():
-                        if not i in self.middlewares:
-                            self.middlewares.append(i)
-
-    def run_before_middlewares(self):
-        for mddl in self.middlewares:
-            mddl(Request).before_request()
+        self.middlewares = dispatch.get_middlewares()
 
     def run_after_middlewares(self):
-        for mddl in self.middlewares:
-            mddl(Request).after_request()
-
-    def set_request(self):
-        Request.currurl = self.path
+        dispatch.run_after_middlewares(self.flow_request, self.middlewares)
 
 
 # @dataclass
@@ -0,0 +1,402 @@
+from email.utils import formatdate, parsedate_to_datetime
+from collections import OrderedDict
+from flow.config.conf import get_setting
+import threading
+import hashlib
+import json
+import stat
+import zlib
+import gzip
+import os
+from flow.http.dispatch import get_mimetype, get_source_path
+from flow.utils.pathindex import get_source_index
+from flow.exceptions.http_exceptions import RangeNotSatisfiableError, MimetypeError
+
+"""
+Static files of SOURCEFILES_PATH. The file is sent with sendfile, responses support conditional GET
+(ETag, Last-Modified) and byte ranges. Small files can be kept in memory with gzip/deflate variants.
+Fingerprinted paths of collectstatic manifest are sent with immutable Cache-Control.
+"""
+
+# content encodings of the cached files in the order of preference
+ENCODINGS = ('gzip', 'deflate')
+# Cache-Control of the fingerprinted files
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+class StaticFile:
+    """
+    Static file and the data of its response headers.
+    """
+    def __init__(self, path: str, file_stat: os.stat_result, mimetype: str):
+        self.path = path
+        self.size = file_stat.st_size
+        self.mtime = int(file_stat.st_mtime)
+        # changes when the file is modified or replaced
+        self.version = (file_stat.st_mtime_ns, file_stat.st_ino, file_stat.st_size)
+        self.etag = f'"{file_stat.st_mtime_ns:x}-{file_stat.st_size:x}"'
+        self.last_modified = formatdate(self.mtime, usegmt=True)
+        self.mimetype = mimetype
+        # the file is requested by its fingerprinted path, its content never changes for the path
+        self.immutable = False
+
+    def is_not_modified(self, headers) -> bool:
+        """
+        Checks If-None-Match and If-Modified-Since request headers.
+        """
+        if_none_match = headers.get('If-None-Match')
+        if if_none_match:
+            return self._etag_matches(if_none_match)
+        if_modified_since = headers.get('If-Modified-Since')
+        if if_modified_since:
+            try:
+                return self.mtime <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def _etag_matches(self, header: str) -> bool:
+        if header.strip() == '*':
+            return True
+        etags = [self.etag] + [self.get_etag(encoding) for encoding in ENCODINGS]
+        for etag in header.split(','):
+            etag = etag.strip()
+            if etag.startswith('W/'):
+                etag = etag[2:]
+            if etag in etags:
+                return True
+        return False
+
+    def get_etag(self, encoding: str = None) -> str:
+        """
+        Returns the ETag of the file content in the encoding.
+        """
+        if encoding:
+            return f'{self.etag[:-1]}-{encoding}"'
+        return self.etag
+
+    def get_range(self, headers) -> tuple[int, int]:
+        """
+        Parses the Range request header. Only one byte range is supported, other ranges are ignored.
+
+        :return: First and last byte of the range or None if the whole file is sent.
+        """
+        range_header = headers.get('Range')
+        if not range_header or not range_header.startswith('bytes='):
+            return None
+        if_range = headers.get('If-Range')
+        if if_range and if_range != self.etag and if_range != self.last_modified:
+            return None
+        ranges = range_header[6:].split(',')
+        if len(ranges) != 1:
+            return None
+        start, _, end = ranges[0].strip().partition('-')
+        try:
+            if not start:
+                # suffix range, the last bytes of the file
+                length = int(end)
+                if length <= 0:
+                    raise RangeNotSatisfiableError(self.size)
+                return max(self.size - length, 0), self.size - 1
+            start = int(start)
+            end = int(end) if end else self.size - 1
+        except ValueError:
+            return None
+        if start >= self.size or start > end:
+            raise RangeNotSatisfiableError(self.size)
+        return start, min(end, self.size - 1)
+
+    def get_headers(self, byte_range: tuple[int, int] = None) -> list[tuple[str, str]]:
+        headers = [('Content-Type', self.mimetype), ('ETag', self.etag), ('Last-Modified', self.last_modified),
+                   ('Accept-Ranges', 'bytes')]
+        if byte_range:
+            start, end = byte_range
+            headers.append(('Content-Range', f'bytes {start}-{end}/{self.size}'))
+            headers.append(('Content-Length', str(end - start + 1)))
+        else:
+            headers.append(('Content-Length', str(self.size)))
+        return headers + self.get_cache_headers()
+
+    def get_validator_headers(self) -> list[tuple[str, str]]:
+        """
+        Headers of the 304 response.
+        """
+        return [('ETag', self.etag), ('Last-Modified', self.last_modified)] + self.get_cache_headers()
+
+    def get_cache_headers(self) -> list[tuple[str, str]]:
+        if self.immutable:
+            return [('Cache-Control', IMMUTABLE_CACHE_CONTROL)]
+        return []
+
+
+def find_static_file(path: str) -> StaticFile:
+    """
+    Finds the static file of the request path. Only files inside SOURCEFILES_PATH directories are served.
+
+    :return: Static file or None if not found.
+    """
+    filepath = os.path.normpath(get_source_path(path.split('?', 1)[0]))
+    manifest_entry = None
+    # the index has only the files inside SOURCEFILES_PATH directories
+    if not get_source_index().contains(filepath):
+        manifest_entry = get_static_manifest().resolve(filepath)
+        if manifest_entry is None:
+            return None
+        filepath = manifest_entry.path
+    try:
+        file_stat = os.stat(filepath)
+    except OSError:
+        return None
+    if not stat.S_ISREG(file_stat.st_mode):
+        return None
+    try:
+        mimetype = get_mimetype(filepath)
+    except MimetypeError:
+        mimetype = 'application/octet-stream'
+    file = StaticFile(filepath, file_stat, mimetype)
+    # a file changed after collectstatic is sent without the immutable cache headers
+    file.immutable = manifest_entry is not None and manifest_entry.matches(file_stat)
+    return file
+
+
+class _ManifestEntry:
+    def __init__(self, path: str, hashed_path: str, mtime_ns: int, size: int):
+        self.path = path
+        self.hashed_path = hashed_path
+        self.mtime_ns = mtime_ns
+        self.size = size
+
+    def matches(self, file_stat: os.stat_result) -> bool:
+        """
+        Checks whether the file is the same as at collectstatic.
+        """
+        return file_stat.st_mtime_ns == self.mtime_ns and file_stat.st_size == self.size
+
+
+class StaticManifest:
+    """
+    Manifest of the fingerprinted source files created by collectstatic command. A fingerprinted path has the hash
+    of the file content before the extension, e.g. 'source/css/main.3f2c1a9b7e04.css'. Fingerprinted paths are
+    served from the original files.
+    """
+    def __init__(self, entries: list[_ManifestEntry] = None):
+        entries = entries or []
+        self._entries: dict[str, _ManifestEntry] = {e.path: e for e in entries}
+        self._hashed: dict[str, _ManifestEntry] = {e.hashed_path: e for e in entries}
+
+    @classmethod
+    def load(cls, manifest_path: str) -> 'StaticManifest':
+        """
+        Loads the manifest file. The manifest is empty if the file does not exist.
+        """
+        try:
+            with open(manifest_path, encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return cls()
+        return cls([_ManifestEntry(path, e['hashed'], e['mtime_ns'], e['size']) for path, e in data['files'].items()])
+
+    def save(self, manifest_path: str):
+        files = {e.path: {'hashed': e.hashed_path, 'mtime_ns': e.mtime_ns, 'size': e.size}
+                 for e in self._entries.values()}
+        tmp_path = f'{manifest_path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': 1, 'files': files}, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, manifest_path)
+
+    def get_url(self, path: str) -> str:
+        """
+        :return: Fingerprinted path of the file or the path if the file is not in the manifest.
+        """
+        entry = self._entries.get(path)
+        if entry is None:
+            return path
+        return entry.hashed_path
+
+    def resolve(self, hashed_path: str) -> _ManifestEntry:
+        return self._hashed.get(hashed_path)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def collect_static(manifest_path: str) -> StaticManifest:
+    """
+    Hashes the content of all source files of SOURCEFILES_PATH and saves the manifest.
+    """
+    index = get_source_index()
+    index.build()
+    entries = []
+    for name in index.names():
+        path = index.get(name)
+        digest = hashlib.md5(usedforsecurity=False)
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(64 * 1024), b''):
+                digest.update(chunk)
+        file_stat = os.stat(path)
+        base, ext = os.path.splitext(path)
+        entries.append(_ManifestEntry(path, f'{base}.{digest.hexdigest()[:12]}{ext}', file_stat.st_mtime_ns,
+                                      file_stat.st_size))
+    manifest = StaticManifest(entries)
+    manifest.save(manifest_path)
+    return manifest
+
+
+_static_manifest: StaticManifest = None
+_static_manifest_lock = threading.Lock()
+
+
+def get_static_manifest() -> StaticManifest:
+    """
+    Returns the manifest of STATIC_MANIFEST setting. The manifest is loaded once, restart the server
+    after collectstatic.
+    """
+    global _static_manifest
+    if _static_manifest is None:
+        with _static_manifest_lock:
+            if _static_manifest is None:
+                _static_manifest = StaticManifest.load(get_setting('STATIC_MANIFEST', 'staticfiles.json'))
+    return _static_manifest
+
+
+class _CachedFile:
+    def __init__(self, version: tuple, variants: dict[str, bytes]):
+        self.version = version
+        # content encoding -> file content, None is the raw content.
+        self.variants = variants
+        self.size = sum(len(v) for v in variants.values())
+
+
+class StaticFileCache:
+    """
+    Bounded LRU cache of small static files. The raw content and its gzip/deflate variants are computed once.
+    A cached file is reloaded when its mtime, inode or size changes.
+    """
+    def __init__(self, max_bytes: int, max_file_size: int):
+        """
+        :param max_bytes: Maximum size of all cached content.
+        :param max_file_size: Files larger than this size are not cached.
+        """
+        self.max_bytes = max_bytes
+        self.max_file_size = max_file_size
+        self._files: OrderedDict[str, _CachedFile] = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, file: StaticFile) -> _CachedFile:
+        """
+        Returns the cached file or None if the file is too large to be cached.
+        """
+        if file.size > self.max_file_size:
+            return None
+        with self._lock:
+            cached = self._files.get(file.path)
+            if cached and cached.version == file.version:
+                self._files.move_to_end(file.path)
+                return cached
+        cached = self._load(file)
+        if cached is None:
+            return None
+        with self._lock:
+            old = self._files.pop(file.path, None)
+            if old:
+                self._size -= old.size
+            self._files[file.path] = cached
+            self._size += cached.size
+            while self._size > self.max_bytes and self._files:
+                path, evicted = self._files.popitem(last=False)
+                self._size -= evicted.size
+        return cached
+
+    def _load(self, file: StaticFile) -> _CachedFile:
+        with open(file.path, 'rb') as f:
+            data = f.read()
+        if len(data) != file.size:
+            # the file was changed while reading
+            return None
+        variants = {None: data}
+        if _is_compressible(file.mimetype):
+            for encoding, compressed in (('gzip', gzip.compress(data, mtime=0)), ('deflate', zlib.compress(data))):
+                if len(compressed) < len(data):
+                    variants[encoding] = compressed
+        cached = _CachedFile(file.version, variants)
+        if cached.size > self.max_bytes:
+            return None
+        return cached
+
+    def clear(self):
+        with self._lock:
+            self._files.clear()
+            self._size = 0
+
+
+def get_cached_response(file: StaticFile, headers) -> tuple[list[tuple[str, str]], bytes]:
+    """
+    Returns the headers and the body of the static file response from the cache, in the best content
+    encoding the client accepts.
+
+    :return: Response headers and body or None if the file is not cached.
+    """
+    cache = get_static_cache()
+    if cache is None:
+        return None
+    cached = cache.get(file)
+    if cached is None:
+        return None
+    encoding = choose_encoding(headers.get('Accept-Encoding'), cached.variants)
+    body = cached.variants[encoding]
+    response_headers = [('Content-Type', file.mimetype), ('ETag', file.get_etag(encoding)),
+                        ('Last-Modified', file.last_modified), ('Accept-Ranges', 'bytes'),
+                        ('Content-Length', str(len(body)))] + file.get_cache_headers()
+    if len(cached.variants) > 1:
+        response_headers.append(('Vary', 'Accept-Encoding'))
+    if encoding:
+        response_headers.append(('Content-Encoding', encoding))
+    return response_headers, body
+
+
+def choose_encoding(accept_encoding: str, variants: dict) -> str:
+    """
+    Chooses the content encoding from the Accept-Encoding header. None is the raw content.
+    """
+    if not accept_encoding or len(variants) == 1:
+        return None
+    accepted = {}
+    for item in accept_encoding.split(','):
+        name, _, params = item.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    for encoding in ENCODINGS:
+        if encoding in variants and accepted.get(encoding, accepted.get('*', 0.0)) > 0:
+            return encoding
+    return None
+
+
+def _is_compressible(mimetype: str) -> bool:
+    return mimetype.startswith('text/') or mimetype in ('application/javascript', 'application/json',
+                                                        'image/svg+xml', 'application/xml')
+
+
+_static_cache: StaticFileCache = None
+_static_cache_lock = threading.Lock()
+
+
+def get_static_cache() -> StaticFileCache:
+    """
+    Returns the static file cache configured by STATIC_CACHE setting or None if the cache is disabled.
+    """
+    global _static_cache
+    if _static_cache is None:
+        settings = get_setting('STATIC_CACHE', {})
+        if not settings.get('max_bytes'):
+            return None
+        with _static_cache_lock:
+            if _static_cache is None:
+                _static_cache = StaticFileCache(settings['max_bytes'], settings.get('max_file_size', 256 * 1024))
+    return _static_cache
@@ -1,7 +1,13 @@
 from abc import abstractmethod, ABCMeta
+import functools
+import inspect
+import asyncio
+import copy
+import time
 from flow.http.render.render import RenderPage
 from flow.database.model.models import QuerySet
 from flow.routing.route import RedirectUrl
+from flow.utils.timings import get_timings
 
 
 class View(metaclass=ABCMeta):
@@ -14,6 +20,14 @@ class View(metaclass=ABCMeta):
         self.template_obj = {}
         self.request = None
         self.queryset: QuerySet = None
+        # сторінка рендериться частинами під час відправки (chunked відповідь)
+        self.stream = False
+        # секунди, протягом яких сторінка зберігається у кеші відповідей, None - сторінка не кешується
+        self.cache_ttl: int = None
+        # заголовки запиту, від яких залежить кешована сторінка
+        self.cache_vary: list[str] = []
+        # таблиці, після зміни яких кешована сторінка видаляється
+        self.cache_tables: list[str] = []
 
     @abstractmethod
     def post(self) -> RedirectUrl:
@@ -22,19 +36,99 @@ class View(metaclass=ABCMeta):
         """
         pass
 
-    def __call__(self, request, **kwargs) -> str:
+    def for_request(self, request) -> 'View':
+        """
+        Повертає копію view для одного запиту.
+        Екземпляр view спільний для всіх запитів маршруту, тому стан запиту зберігається лише у копії.
+        :param request: Поточний запит.
+        """
+        view = copy.copy(self)
+        view.template_obj = dict(self.template_obj)
+        view.request = request
+        return view
+
+    def __call__(self, request, **kwargs):
         """
         Виконнаня усієї логіки view.
+        html_page може бути рядком, bytes або ітератором частин сторінки, який відправляється частинами.
         :param request:
         :param kwargs:
         :return:
         """
-        self.request = request
-        if 'slug_value' in kwargs.keys():
-            self.render(slug_val=kwargs['slug_value'])
+        view = self.for_request(request)
+        start = time.perf_counter()
+        if inspect.iscoroutinefunction(view.render):
+            asyncio.run(view.render(**view._render_kwargs(kwargs)))
+        else:
+            view.render(**view._render_kwargs(kwargs))
+        return view._timed_page(time.perf_counter() - start)
+
+    async def call_async(self, request, **kwargs):
+        """
+        Виконання логіки view у циклі подій asyncio.
+        Метод render може бути корутиною, звичайний render виконується у executor циклу подій.
+        :param request:
+        :param kwargs:
+        :return:
+        """
+        view = self.for_request(request)
+        start = time.perf_counter()
+        if inspect.iscoroutinefunction(view.render):
+            await view.render(**view._render_kwargs(kwargs))
         else:
-            self.render()
-        return self.html_page
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, functools.partial(view.render, **view._render_kwargs(kwargs)))
+        return view._timed_page(time.perf_counter() - start)
+
+    def _timed_page(self, spent: float):
+        """
+        Записує час view у таймінги. Для сторінки, яка відправляється частинами, час render
+        додається до часу ітерації по частинах, бо основна робота виконується під час ітерації.
+        :param spent: Час виконання render.
+        """
+        timings = get_timings()
+        page = self.html_page
+        if not timings.enabled:
+            return page
+        name = type(self).__name__
+        if page is None or isinstance(page, (str, bytes, bytearray)):
+            timings.observe('view', name, spent)
+            return page
+        if hasattr(page, '__aiter__'):
+            return timings.timed_aiter('view', name, page, spent)
+        return timings.timed_iter('view', name, page, spent)
+
+    @staticmethod
+    def _render_kwargs(kwargs: dict) -> dict:
+        if 'slug_value' in kwargs.keys():
+            return {'slug_val': kwargs['slug_value']}
+        return {}
+
+    def get_cache_tables(self) -> list[str]:
+        """
+        Таблиці, від яких залежить кешована сторінка view. Таблиця моделі view додається автоматично.
+        """
+        tables = list(self.cache_tables)
+        model = getattr(self, 'model', None)
+        if model is not None:
+            tables.append(model.__name__.lower())
+        return tables
+
+    def _render_template(self, **kwargs):
+        """
+        Рендерить шаблон view повністю або, якщо stream, повертає генератор частин сторінки.
+        """
+        if self.stream:
+            return RenderPage(self.template_path).stream(**kwargs)
+        return RenderPage(self.template_path).render(**kwargs)
+
+    async def _render_template_async(self, **kwargs):
+        """
+        Асинхронний _render_template для view з 'async def render', шаблон рендериться без блокування циклу подій.
+        """
+        if self.stream:
+            return RenderPage(self.template_path).stream_async(**kwargs)
+        return await RenderPage(self.template_path).render_async(**kwargs)
 
     @abstractmethod
     def render(self, **kwargs):
@@ -56,7 +150,7 @@ class TemplateView(View):
         pass
 
     def render(self, **kwargs):
-        self.html_page = RenderPage(self.template_path).render()
+        self.html_page = self._render_template()
         return self
 
 
@@ -68,14 +162,18 @@ class ListView(View):
         super(ListView, self).__init__()
         self.model = None
         self.obj_name = ''
+        # поля FK, пов'язані рядки яких завантажуються разом зі списком (JOIN або один запит IN на поле)
+        self.select_related: list[str] = []
+        self.prefetch_related: list[str] = []
 
     def post(self) -> RedirectUrl:
         pass
 
     def render(self, **kwargs):
-        self.queryset = self.model().db.all()
+        self.queryset = self.model().db.select_related(*self.select_related)\
+            .prefetch_related(*self.prefetch_related).all()
         self.template_obj[self.obj_name] = self.queryset
-        self.html_page = RenderPage(self.template_path).render(**self.template_obj)
+        self.html_page = self._render_template(**self.template_obj)
         return self
 
 
@@ -88,12 +186,15 @@ class ObjectView(View):
         self.model = None
         self.obj_name = ''
         self.slug_field = ''
+        # поля FK, пов'язані рядки яких завантажуються тим самим запитом (JOIN)
+        self.select_related: list[str] = []
 
     def post(self) -> RedirectUrl:
         pass
 
     def render(self, **kwargs):
-        self.queryset = self.model().db.get(**{self.slug_field: kwargs['slug_val']})
+        self.queryset = self.model().db.select_related(*self.select_related)\
+            .get(**{self.slug_field: kwargs['slug_val']})
         self.template_obj[self.obj_name] = self.queryset
-        self.html_page = RenderPage(self.template_path).render(**self.template_obj)
+        self.html_page = self._render_template(**self.template_obj)
         return self
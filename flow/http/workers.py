@@ -0,0 +1,203 @@
+from http.server import HTTPServer
+from flow.http.server import ThreadPoolHTTPServer
+from flow.routing.router import get_router
+from flow.http.dispatch import get_middlewares
+from flow.http.render.render import get_environment
+from flow.utils.pathindex import get_template_index, get_source_index
+from flow.exceptions.http_exceptions import WorkerCrashError
+import threading
+import signal
+import socket
+import time
+import os
+
+
+class PreforkServer:
+    """
+    Master process that pre-forks worker processes. Workers accept connections from one shared listening socket,
+    or each worker binds its own socket with SO_REUSEPORT.
+    Settings, routes and template extensions are imported once in the master before forking.
+    A crashed worker is restarted after a delay that doubles with each recent crash. When workers crash more than
+    max_crashes times in crash_period seconds, the master stops the server.
+    """
+    def __init__(self, server_address: tuple, handler_class, workers: int, threads: int = 0, reuse_port: bool = False,
+                 graceful_timeout: int = 30, max_crashes: int = 10, crash_period: float = 60):
+        """
+        :param server_address: Host and port of the server.
+        :param handler_class: Request handler class.
+        :param workers: Number of worker processes.
+        :param threads: Number of threads in each worker. With 0, a worker handles one request at a time.
+        :param reuse_port: Each worker binds its own socket with SO_REUSEPORT instead of sharing the master socket.
+        :param graceful_timeout: Seconds to wait for workers to finish in-flight requests before killing them.
+        :param max_crashes: Number of worker crashes in crash_period seconds that stops the server.
+        :param crash_period: Seconds in which the crashes are counted.
+        """
+        self.server_address = server_address
+        self.handler_class = handler_class
+        self.workers = workers
+        self.threads = threads
+        self.reuse_port = reuse_port
+        self.graceful_timeout = graceful_timeout
+        self.max_crashes = max_crashes
+        self.crash_period = crash_period
+        self._socket: socket.socket = None
+        self._workers: set[int] = set()
+        self._retiring: dict[int, float] = {}
+        # times of the recent crashes and of the delayed restarts
+        self._crashes: list[float] = []
+        self._respawns: list[float] = []
+        self._stopping = False
+        self._restart = False
+
+    def preload(self):
+        """
+        Imports the project modules in the master, so workers get them already loaded.
+        """
+        get_router()
+        get_middlewares()
+        get_environment()
+        get_template_index()
+        get_source_index()
+
+    def serve_forever(self):
+        self.preload()
+        if not self.reuse_port:
+            self._socket = self._make_server().socket
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+        signal.signal(signal.SIGHUP, self._on_restart)
+
+        for _ in range(self.workers):
+            self._spawn_worker()
+
+        while self._workers or self._retiring or (self._respawns and not self._stopping):
+            if self._stopping:
+                self._retire(self._workers)
+                self._respawns.clear()
+            elif self._restart:
+                self._restart = False
+                old_workers = set(self._workers)
+                for _ in old_workers:
+                    self._spawn_worker()
+                self._retire(old_workers)
+            self._reap_workers()
+            self._respawn_crashed()
+            self._kill_timed_out()
+            time.sleep(0.2)
+        if len(self._crashes) > self.max_crashes:
+            raise WorkerCrashError(len(self._crashes), self.crash_period)
+
+    def server_close(self):
+        if self._socket:
+            self._socket.close()
+
+    def _make_server(self) -> HTTPServer:
+        """
+        Creates the server, which binds the listening socket.
+        """
+        if self.threads:
+            server = ThreadPoolHTTPServer(self.server_address, self.handler_class, self.threads, bind_and_activate=False)
+        else:
+            server = HTTPServer(self.server_address, self.handler_class, bind_and_activate=False)
+        if self.reuse_port or self._socket is None:
+            if self.reuse_port:
+                server.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            try:
+                server.server_bind()
+                server.server_activate()
+            except Exception:
+                server.server_close()
+                raise
+        else:
+            server.socket.close()
+            server.socket = self._socket
+        return server
+
+    def _spawn_worker(self):
+        pid = os.fork()
+        if pid == 0:
+            exitcode = 0
+            try:
+                self._run_worker()
+            except BaseException:
+                exitcode = 1
+            finally:
+                os._exit(exitcode)
+        self._workers.add(pid)
+
+    def _run_worker(self):
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGHUP, signal.SIG_DFL)
+        server = self._make_server()
+
+        def stop(signum, frame):
+            # shutdown() waits for serve_forever(), so it cannot be called from the main thread.
+            threading.Thread(target=server.shutdown, daemon=True).start()
+
+        signal.signal(signal.SIGTERM, stop)
+        server.serve_forever()
+        # finishes in-flight requests
+        server.server_close()
+
+    def _retire(self, pids: set[int]):
+        """
+        Asks workers to finish in-flight requests and exit.
+        """
+        for pid in list(pids):
+            self._workers.discard(pid)
+            self._retiring[pid] = time.monotonic()
+            self._signal(pid, signal.SIGTERM)
+
+    def _reap_workers(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if not pid:
+                return
+            if pid in self._retiring:
+                del self._retiring[pid]
+            elif pid in self._workers:
+                self._workers.discard(pid)
+                if not self._stopping:
+                    self._on_crash(pid, status)
+
+    def _on_crash(self, pid: int, status: int):
+        now = time.monotonic()
+        self._crashes = [t for t in self._crashes if now - t < self.crash_period]
+        self._crashes.append(now)
+        if len(self._crashes) > self.max_crashes:
+            print(f"Worker {pid} exited with status {status}, stopping the server.")
+            self._stopping = True
+            return
+        delay = min(0.2 * 2 ** (len(self._crashes) - 1), 30)
+        print(f"Worker {pid} exited with status {status}, restarting in {delay:g} seconds.")
+        self._respawns.append(now + delay)
+
+    def _respawn_crashed(self):
+        now = time.monotonic()
+        due = [t for t in self._respawns if t <= now]
+        if not due or self._stopping:
+            return
+        self._respawns = [t for t in self._respawns if t > now]
+        for _ in due:
+            self._spawn_worker()
+
+    def _kill_timed_out(self):
+        for pid, started in list(self._retiring.items()):
+            if time.monotonic() - started > self.graceful_timeout:
+                self._signal(pid, signal.SIGKILL)
+
+    @staticmethod
+    def _signal(pid: int, signum: int):
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
+
+    def _on_stop(self, signum, frame):
+        self._stopping = True
+
+    def _on_restart(self, signum, frame):
+        self._restart = True
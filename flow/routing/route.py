@@ -1,4 +1,5 @@
 from dataclasses import dataclass
+import copy
 from flow.exceptions.http_exceptions import RedirectError
 
 
@@ -12,6 +13,10 @@ class Url:
         self.header = ()
         self.code = None
         self.redirect: bool = False
+        # seconds the page of the route is kept in the response cache, None - the view setting is used
+        self.cache: int = None
+        # request headers the cached page depends on
+        self.cache_vary: list[str] = None
 
 
 class RedirectUrl:
@@ -19,23 +24,16 @@ class RedirectUrl:
     Redirect to selected url.
     """
     def __init__(self, urlname, **kwargs):
-        from fconfig.froute import routings
-        self.u: Url = None
-        for route in routings:
-            if route.name == urlname:
-                # path = Route.parse_path(route.path)
-                # self.u = Url(route.path, route.handler, route.name)
-                self.u = Url(route.path.path, route.handler, route.name)
-                # self.u.header = ('Content-type', '')
-                if 'slug_value' in kwargs.keys():
-                    self.u.slug_value = kwargs['slug_value']
-                    self.u.header = ('Location', route.path.path.replace(route.path.slug_f, str(self.u.slug_value)))
-                else:
-                    self.u.header = ('Location', route.path.path)
-                self.u.code = 303
-                self.u.redirect = True
-        if not self.u:
+        from flow.routing.router import get_router
+        router = get_router()
+        route = router.get_url(urlname)
+        if not route:
             raise RedirectError(urlname)
+        self.u: Url = copy.copy(route)
+        self.u.slug_value = kwargs.get('slug_value')
+        self.u.header = ('Location', router.reverse(urlname, self.u.slug_value))
+        self.u.code = 303
+        self.u.redirect = True
 
     def redirect(self) -> Url:
         return self.u
@@ -45,10 +43,16 @@ class Route:
     _urls = []
 
     @classmethod
-    def url(cls, path: str, handler, name: str) -> Url:
+    def url(cls, path: str, handler, name: str, cache: int = None, cache_vary: list[str] = None) -> Url:
+        """
+        :param cache: Seconds the page is kept in the response cache. 0 disables the cache of the view.
+        :param cache_vary: Request headers the cached page depends on, e.g. ['Accept-Language'].
+        """
         u = Url(path, handler, name)
         u.header = ('Content-type', 'a')
         u.code = 200
+        u.cache = cache
+        u.cache_vary = cache_vary
         return u
 
     @staticmethod
@@ -0,0 +1,205 @@
+from flow.routing.route import Url
+from flow.exceptions.http_exceptions import RouteError, UrlNotFoundError
+import importlib
+
+"""
+Routes compiled into a trie of path segments.
+A route path segment is either static text or a slug '[name]', '[name:str]' or '[name:int]'.
+A path is resolved with one walk over its segments, static segments are checked before slugs.
+Slug edges of the trie are keyed by the slug type only, so routes can name the slugs of a shared prefix
+differently. The slug names are kept on the node of the route.
+"""
+
+SLUG_TYPES = ('str', 'int')
+
+
+class _Slug:
+    def __init__(self, slug_type: str):
+        self.slug_type = slug_type
+        self.node = _Node()
+
+    def convert(self, segment: str):
+        """
+        Converts the path segment to the slug type. Returns None if the segment does not fit the type.
+        """
+        match self.slug_type:
+            case 'int':
+                # isdigit() also accepts unicode digits such as '²', int() fails on them
+                if segment.isascii() and segment.isdigit():
+                    return int(segment)
+                return None
+            case _:
+                if segment:
+                    return segment
+                return None
+
+
+class _ReverseUrl:
+    """
+    Precompiled builder of the route path. Static parts of the path are kept in a format string with
+    a placeholder for each slug.
+    """
+    def __init__(self, url: Url, template: str, slug_names: list[str]):
+        self.url = url
+        self.template = template
+        self.slug_names = slug_names
+
+    def build(self, slug_value=None) -> str:
+        """
+        :param slug_value: Value of the only slug, or a dictionary with the values of all slugs.
+        """
+        if not self.slug_names:
+            return self.url.path.path
+        names = ', '.join(f"'{name}'" for name in self.slug_names)
+        if isinstance(slug_value, dict):
+            missing = ', '.join(f"'{name}'" for name in self.slug_names if name not in slug_value)
+            if missing:
+                raise RouteError(self.url.path.path, f"reverse got no value for the slugs {missing}")
+            return self.template.format(*[slug_value[name] for name in self.slug_names])
+        if slug_value is None:
+            raise RouteError(self.url.path.path, f"reverse needs a value for the slugs {names}")
+        if len(self.slug_names) > 1:
+            raise RouteError(self.url.path.path, f"reverse needs a dictionary with the values of the slugs {names}")
+        return self.template.format(slug_value)
+
+
+class _Node:
+    def __init__(self):
+        self.static: dict[str, _Node] = {}
+        self.slugs: list[_Slug] = []
+        self.url: Url = None
+        # names of the slug values of the route path, in the order of the path
+        self.slug_names: list[str] = None
+
+
+class Router:
+    """
+    Resolves the request path to the route and its slug values.
+    """
+    def __init__(self, routings: list[Url]):
+        self._root = _Node()
+        self._names: dict[str, _ReverseUrl] = {}
+        for url in routings:
+            self.add(url)
+
+    def add(self, url: Url):
+        node = self._root
+        template = []
+        slug_names = []
+        for segment in split_path(url.path.path):
+            if segment.startswith('[') and segment.endswith(']'):
+                name, slug_type = self._parse_slug(segment, url.path.path)
+                if name in slug_names:
+                    raise RouteError(url.path.path, f"slug '{name}' is repeated")
+                node = self._add_slug(node, slug_type)
+                template.append('{}')
+                slug_names.append(name)
+            elif '[' in segment or ']' in segment:
+                raise RouteError(url.path.path, f"slug must take the whole segment '{segment}'")
+            else:
+                node = node.static.setdefault(segment, _Node())
+                template.append(segment.replace('{', '{{').replace('}', '}}'))
+        if node.url is None:
+            node.url = url
+            node.slug_names = slug_names
+        if url.name not in self._names:
+            self._names[url.name] = _ReverseUrl(url, '/' + '/'.join(template), slug_names)
+
+    def get_url(self, name: str) -> Url:
+        """
+        Returns the route with the name or None.
+        """
+        reverse_url = self._names.get(name)
+        if reverse_url is None:
+            return None
+        return reverse_url.url
+
+    def reverse(self, name: str, slug_value=None) -> str:
+        """
+        Builds the path of the route with the name.
+
+        :param name: Route name.
+        :param slug_value: Value of the only slug, or a dictionary with the values of all slugs.
+        """
+        reverse_url = self._names.get(name)
+        if reverse_url is None:
+            raise UrlNotFoundError(name)
+        return reverse_url.build(slug_value)
+
+    @staticmethod
+    def _parse_slug(segment: str, path: str) -> tuple[str, str]:
+        """
+        :return: Name and type of the slug segment.
+        """
+        name, _, slug_type = segment[1:-1].partition(':')
+        slug_type = slug_type or 'str'
+        if slug_type not in SLUG_TYPES:
+            raise RouteError(path, f"unknown slug type '{slug_type}'")
+        return name, slug_type
+
+    @staticmethod
+    def _add_slug(node: _Node, slug_type: str) -> _Node:
+        for slug in node.slugs:
+            if slug.slug_type == slug_type:
+                return slug.node
+        slug = _Slug(slug_type)
+        node.slugs.append(slug)
+        # int slugs are checked before str slugs
+        node.slugs.sort(key=lambda s: s.slug_type != 'int')
+        return slug.node
+
+    def resolve(self, path: str) -> tuple[Url, dict]:
+        """
+        :param path: Request path, the query string is ignored.
+        :return: Route and slug values or (None, None) if the route is not found.
+        """
+        segments = split_path(path.split('?', 1)[0])
+        values = []
+        node = self._resolve(self._root, segments, 0, values)
+        if node is None:
+            return None, None
+        return node.url, dict(zip(node.slug_names, values))
+
+    def _resolve(self, node: _Node, segments: list[str], index: int, values: list) -> _Node:
+        """
+        :return: Node of the route, the slug values of its path are left in 'values'.
+        """
+        if index == len(segments):
+            return node if node.url is not None else None
+        segment = segments[index]
+        static_node = node.static.get(segment)
+        if static_node is not None:
+            found = self._resolve(static_node, segments, index + 1, values)
+            if found is not None:
+                return found
+        for slug in node.slugs:
+            value = slug.convert(segment)
+            if value is None:
+                continue
+            values.append(value)
+            found = self._resolve(slug.node, segments, index + 1, values)
+            if found is not None:
+                return found
+            values.pop()
+        return None
+
+
+def split_path(path: str) -> list[str]:
+    """
+    Splits the path into segments. A trailing slash gives an empty last segment, so '/posts' and '/posts/'
+    are different paths.
+    """
+    return path.split('/')[1:]
+
+
+_router: Router = None
+
+
+def get_router() -> Router:
+    """
+    Returns the router of the project routes. The routes are compiled at the first call.
+    """
+    global _router
+    if _router is None:
+        _router = Router(importlib.import_module('fconfig.froute').routings)
+    return _router
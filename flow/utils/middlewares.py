@@ -1,8 +1,15 @@
 from flow.http.request import Request
-from flow.routing.route import RedirectUrl
+from flow.routing.route import RedirectUrl, Url
+from flow.utils.timings import get_timings
+import importlib
+import os
 
 
 class Middleware:
+    """
+    Base class of the project middlewares. A new middleware object is created for every request,
+    the same object runs before_request and after_request of the request.
+    """
     def __init__(self, request: Request):
         self.request = request
 
@@ -11,6 +18,10 @@ class Middleware:
         # return self.request
 
     def before_request(self):
+        """
+        Runs before the view. Returning a redirect (self.redirect()) or a page (str, bytes or an iterator of parts)
+        stops the next middlewares, and the returned response is sent instead of the view page.
+        """
         pass
 
     def redirect(self, urlname, slug_value=None):
@@ -18,3 +29,60 @@ class Middleware:
             return RedirectUrl(urlname, slug_value=slug_value).redirect()
         else:
             return RedirectUrl(urlname).redirect()
+
+
+class MiddlewarePipeline:
+    """
+    Ordered middleware classes of the project. The pipeline is loaded once, before_request runs once
+    per request and after_request once per response, in the reverse order.
+    """
+    def __init__(self, middlewares: list[type[Middleware]]):
+        self.middlewares = middlewares
+
+    @classmethod
+    def load(cls, middlewares_paths: list[str], middlewares_names: list[str]) -> 'MiddlewarePipeline':
+        """
+        Imports the middleware modules. Middlewares are ordered as the modules in MIDDLEWARES setting.
+        """
+        middlewares = []
+        for mddl_name in middlewares_names:
+            for mddl_path in middlewares_paths:
+                if os.path.exists(os.path.join(mddl_path, mddl_name + '.py')):
+                    module = importlib.import_module(f'{mddl_path.replace("/", ".")}{mddl_name}')
+                    for mddl in Middleware.__subclasses__():
+                        if mddl.__module__ == module.__name__ and mddl not in middlewares:
+                            middlewares.append(mddl)
+        return cls(middlewares)
+
+    def before_request(self, request: Request):
+        """
+        Runs before_request of the middlewares. A redirect returned by a middleware is set to request.url_obj,
+        a returned page is set to request.page.
+        """
+        timings = get_timings()
+        for mddl_class in self.middlewares:
+            mddl = mddl_class(request)
+            request.middlewares.append(mddl)
+            with timings.time('middleware.before', mddl_class.__name__):
+                response = mddl.before_request()
+            if response is None:
+                continue
+            if isinstance(response, RedirectUrl):
+                response = response.redirect()
+            if isinstance(response, Url):
+                request.url_obj = response
+            else:
+                request.page = response
+            return
+
+    def after_request(self, request: Request):
+        timings = get_timings()
+        for mddl in reversed(request.middlewares):
+            with timings.time('middleware.after', type(mddl).__name__):
+                mddl.after_request()
+
+    def __iter__(self):
+        return iter(self.middlewares)
+
+    def __len__(self):
+        return len(self.middlewares)
@@ -0,0 +1,151 @@
+from flow.config.conf import get_setting
+import threading
+import fconfig
+import time
+import os
+
+"""
+Indexes of the template and source files. Directories are scanned once, so a file is found without probing
+every directory on each render. With PATH_INDEX_WATCH setting, a thread rebuilds the index when files are
+added or removed.
+"""
+
+
+class PathIndex:
+    """
+    Index of the files of the root directories. A file name relative to its root maps to the file path,
+    the first root with the name is used.
+    """
+    def __init__(self, roots: list[str], watch_interval: float = 1.0, follow_links: bool = True,
+                 outside_links: bool = False):
+        """
+        :param roots: Root directories in the order of priority.
+        :param watch_interval: Seconds between the checks of the watcher.
+        :param follow_links: Index the files of the linked directories.
+        :param outside_links: Index the links to the files outside the roots.
+        """
+        self.roots = roots
+        self.watch_interval = watch_interval
+        self.follow_links = follow_links
+        self.outside_links = outside_links
+        self._names: dict[str, str] = {}
+        self._paths: frozenset[str] = frozenset()
+        self._snapshot: dict[str, int] = {}
+        self._watch_pid: int = None
+        self._lock = threading.Lock()
+        self.build()
+
+    def build(self):
+        names = {}
+        snapshot = {}
+        for root in self.roots:
+            real_root = os.path.join(os.path.realpath(root), '')
+            for dirpath, dirnames, filenames in self._walk(root):
+                snapshot[dirpath] = _get_mtime(dirpath)
+                for filename in filenames:
+                    path = os.path.normpath(os.path.join(dirpath, filename))
+                    if not self.outside_links and not os.path.realpath(path).startswith(real_root):
+                        continue
+                    name = os.path.relpath(path, root).replace(os.sep, '/')
+                    names.setdefault(name, path)
+        # readers get the old or the new index, never a partial one
+        self._names = names
+        self._paths = frozenset(names.values())
+        self._snapshot = snapshot
+
+    def _walk(self, root: str):
+        """
+        os.walk of the root. A linked directory already walked (a link loop) is not walked again.
+        """
+        visited = set()
+        for dirpath, dirnames, filenames in os.walk(root, followlinks=self.follow_links):
+            visited.add(os.path.realpath(dirpath))
+            if self.follow_links:
+                dirnames[:] = [d for d in dirnames if os.path.realpath(os.path.join(dirpath, d)) not in visited]
+            yield dirpath, dirnames, filenames
+
+    def get(self, name: str) -> str:
+        """
+        :param name: File name relative to the root.
+        :return: File path or None.
+        """
+        return self._names.get(name.lstrip('/'))
+
+    def contains(self, path: str) -> bool:
+        """
+        Checks whether the path (root and name) is an indexed file.
+        """
+        return os.path.normpath(path) in self._paths
+
+    def names(self) -> list[str]:
+        return sorted(self._names)
+
+    def watch(self):
+        """
+        Starts the thread that rebuilds the index when a directory is changed. The thread is started once
+        in every process, so workers forked after the start get their own thread.
+        """
+        if self._watch_pid == os.getpid():
+            return
+        with self._lock:
+            if self._watch_pid == os.getpid():
+                return
+            self._watch_pid = os.getpid()
+        threading.Thread(target=self._watch, daemon=True).start()
+
+    def _watch(self):
+        while True:
+            time.sleep(self.watch_interval)
+            if self._is_changed():
+                self.build()
+
+    def _is_changed(self) -> bool:
+        """
+        A directory mtime changes when a file of the directory is added, removed or renamed.
+        """
+        dirpaths = set()
+        for root in self.roots:
+            for dirpath, dirnames, filenames in self._walk(root):
+                dirpaths.add(dirpath)
+                if self._snapshot.get(dirpath) != _get_mtime(dirpath):
+                    return True
+        return dirpaths != self._snapshot.keys()
+
+
+def _get_mtime(path: str) -> int:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+_indexes: dict[str, PathIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def _get_index(name: str, roots: list[str], **kwargs) -> PathIndex:
+    index = _indexes.get(name)
+    if index is None:
+        with _indexes_lock:
+            index = _indexes.get(name)
+            if index is None:
+                index = _indexes[name] = PathIndex(roots, **kwargs)
+    if get_setting('PATH_INDEX_WATCH', False):
+        index.watch()
+    return index
+
+
+def get_template_index() -> PathIndex:
+    """
+    Index of the templates of TEMPLATES_PATH. Templates may be links to the files outside the template
+    directories, as with the file system loader of Jinja.
+    """
+    return _get_index('templates', fconfig.fsettings.TEMPLATES_PATH, outside_links=True)
+
+
+def get_source_index() -> PathIndex:
+    """
+    Index of the source files of SOURCEFILES_PATH. The files are served to the clients, so links to the files
+    outside the source directories are not indexed.
+    """
+    return _get_index('sources', fconfig.fsettings.SOURCEFILES_PATH)
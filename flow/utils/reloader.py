@@ -98,23 +98,27 @@ class Reloader(CheckFileModification):
     """
     Поток який реалізує запуск та обробку модифікаї файла.
     """
-    def __init__(self, project_path: str, skipdirs: list[str] = [], daemon=None):
+    def __init__(self, project_path: str, skipdirs: list[str] = [], server_args: list[str] = [], daemon=None):
+        """
+        :param server_args: Додаткові аргументи команди 'startserver'.
+        """
         super(Reloader, self).__init__(project_path, skipdirs, daemon=daemon)
         self._proc = None
+        self._server_args = server_args
 
     def run(self) -> None:
-        self._proc = subprocess.Popen(['python3', 'main.py', 'startserver'])
+        self._proc = subprocess.Popen(['python3', 'main.py', 'startserver', *self._server_args])
         super(Reloader, self).run()
 
     def on_trigger(self, stat: dict):
         self._proc.terminate()
         print("Server stopped.")
-        self._proc = subprocess.Popen(['python3', 'main.py', 'startserver'])
+        self._proc = subprocess.Popen(['python3', 'main.py', 'startserver', *self._server_args])
 
 
-def start_reloader():
+def start_reloader(server_args: list[str] = []):
     try:
-        Reloader(os.getcwd(), skipdirs=['venv', '.idea', '__pycache__'], daemon=True).start()
+        Reloader(os.getcwd(), skipdirs=['venv', '.idea', '__pycache__'], server_args=server_args, daemon=True).start()
         while True:
             time.sleep(1000)
     except KeyboardInterrupt:
@@ -0,0 +1,95 @@
+import threading
+import asyncio
+
+"""
+Coalescing of identical in-flight work. While a call with a key is running, other calls with the same key
+do not run the function, they wait for the running call and share its result or exception.
+"""
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: BaseException = None
+
+
+class SingleFlight:
+    """
+    Coalescing of calls made from different threads.
+    """
+    def __init__(self):
+        self._calls: dict[object, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func: callable, *args, **kwargs) -> tuple[object, bool]:
+        """
+        Runs the function once for all concurrent calls with the key.
+
+        :return: Result of the function and whether the result is shared with another call.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+        try:
+            call.result = func(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def forget(self, predicate: callable):
+        """
+        Next calls with the keys that match the predicate do not wait for the running calls, e.g. after
+        the data the running calls read was changed.
+        """
+        with self._lock:
+            for key in [key for key in self._calls if predicate(key)]:
+                del self._calls[key]
+
+
+class AsyncSingleFlight:
+    """
+    Coalescing of coroutines of one event loop.
+    """
+    def __init__(self):
+        self._calls: dict[object, asyncio.Future] = {}
+
+    async def do(self, key, func: callable, *args, **kwargs) -> tuple[object, bool]:
+        """
+        Awaits the coroutine function once for all concurrent calls with the key.
+
+        :return: Result of the function and whether the result is shared with another call.
+        """
+        future = self._calls.get(key)
+        if future is not None:
+            return await asyncio.shield(future), True
+        future = self._calls[key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await func(*args, **kwargs)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # the exception is raised to the waiting calls, it does not need to be retrieved here
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+        finally:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+        return result, False
@@ -0,0 +1,193 @@
+from flow.config.conf import get_setting
+import threading
+import bisect
+import time
+
+"""
+Timing histograms of the request handling stages. Every stage is measured by name, e.g. the view class or
+the template name. Histograms are kept in the process, with pre-forked workers each worker has its own.
+Stages: 'routing', 'middleware.before', 'middleware.after', 'view', 'template', 'write'.
+For streamed pages 'view' and 'template' include the time of producing the parts. The parts are produced while
+they are sent, so 'write' of a streamed page includes that time as well.
+"""
+
+# upper bounds of the histogram buckets in seconds, the last bucket has no bound
+BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+           0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min: float = None
+        self.max: float = None
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if self.min is None or seconds < self.min:
+            self.min = seconds
+        if self.max is None or seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, p: float) -> float:
+        """
+        Upper bound of the bucket of the percentile, the maximum for the last bucket.
+        """
+        if not self.count:
+            return None
+        rank = p / 100 * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return min(BUCKETS[i], self.max) if i < len(BUCKETS) else self.max
+        return self.max
+
+    def snapshot(self) -> dict:
+        return {'count': self.count, 'total': self.total, 'min': self.min, 'max': self.max,
+                'mean': self.total / self.count if self.count else None,
+                'p50': self.percentile(50), 'p90': self.percentile(90), 'p99': self.percentile(99),
+                'buckets': dict(zip([str(b) for b in BUCKETS] + ['inf'], self.counts))}
+
+
+class _Timer:
+    def __init__(self, timings: 'Timings', stage: str, name: str):
+        self._timings = timings
+        self._stage = stage
+        self._name = name
+        self._start = 0.0
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._timings.observe(self._stage, self._name, time.perf_counter() - self._start)
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+
+_null_timer = _NullTimer()
+
+
+class Timings:
+    """
+    Histograms by stage and name.
+    """
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._histograms: dict[tuple[str, str], Histogram] = {}
+        self._lock = threading.Lock()
+
+    def time(self, stage: str, name: str = ''):
+        """
+        Context manager that measures the time of the block.
+        """
+        if not self.enabled:
+            return _null_timer
+        return _Timer(self, stage, name)
+
+    def observe(self, stage: str, name: str, seconds: float):
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self._histograms.get((stage, name))
+            if histogram is None:
+                histogram = self._histograms[(stage, name)] = Histogram()
+            histogram.observe(seconds)
+
+    def timed_iter(self, stage: str, name: str, iterator, spent: float = 0.0):
+        """
+        Wraps the iterator of a streamed page, the time spent in the iterator is measured.
+
+        :param spent: Time already spent on the stage before the iteration, e.g. creating the iterator.
+        """
+        if not self.enabled:
+            return iterator
+        return self._timed_iter(stage, name, iterator, spent)
+
+    def _timed_iter(self, stage: str, name: str, iterator, spent: float):
+        iterator = iter(iterator)
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    part = next(iterator)
+                except StopIteration:
+                    spent += time.perf_counter() - start
+                    return
+                spent += time.perf_counter() - start
+                yield part
+        finally:
+            self.observe(stage, name, spent)
+
+    def timed_aiter(self, stage: str, name: str, iterator, spent: float = 0.0):
+        """
+        timed_iter for the async generator of a streamed page.
+        """
+        if not self.enabled:
+            return iterator
+        return self._timed_aiter(stage, name, iterator, spent)
+
+    async def _timed_aiter(self, stage: str, name: str, iterator, spent: float):
+        iterator = iterator.__aiter__()
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    part = await iterator.__anext__()
+                except StopAsyncIteration:
+                    spent += time.perf_counter() - start
+                    return
+                spent += time.perf_counter() - start
+                yield part
+        finally:
+            self.observe(stage, name, spent)
+
+    def snapshot(self) -> dict[str, dict[str, dict]]:
+        """
+        :return: stage -> name -> histogram data.
+        """
+        with self._lock:
+            data = {}
+            for (stage, name), histogram in self._histograms.items():
+                data.setdefault(stage, {})[name] = histogram.snapshot()
+            return data
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+    def report(self) -> str:
+        """
+        Text table of the histograms, times are in milliseconds.
+        """
+        lines = [f"{'stage':<18} {'name':<32} {'count':>8} {'mean':>9} {'p50':>9} {'p90':>9} {'p99':>9} {'max':>9}"]
+        for stage, names in sorted(self.snapshot().items()):
+            for name, h in sorted(names.items()):
+                lines.append(f"{stage:<18} {name:<32} {h['count']:>8} {h['mean'] * 1000:>9.3f} {h['p50'] * 1000:>9.3f} "
+                             f"{h['p90'] * 1000:>9.3f} {h['p99'] * 1000:>9.3f} {h['max'] * 1000:>9.3f}")
+        return '\n'.join(lines)
+
+
+_timings: Timings = None
+
+
+def get_timings() -> Timings:
+    """
+    Returns the timings of the process, they are enabled by TIMINGS setting.
+    """
+    global _timings
+    if _timings is None:
+        _timings = Timings(get_setting('TIMINGS', False))
+    return _timings